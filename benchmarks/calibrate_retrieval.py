@@ -0,0 +1,85 @@
+"""Calibration of RetrievalIndex.min_similarity on real articles.
+
+Indexes Wikipedia articles (fetched live like the wikisearch node does; no API key needed) and
+scores consultation-style queries against every article: the article each query is about
+(relevant) and the others (unrelated). Reports both similarity distributions and, for a range of
+thresholds, the share of relevant lookups answered locally and of unrelated articles accepted.
+
+    python -m benchmarks.calibrate_retrieval --thresholds 0.12 0.15 0.18 0.2 0.25
+    python -m benchmarks.calibrate_retrieval --docs articles.jsonl  # {"title": ..., "text": ...} per line, offline
+"""
+
+import argparse
+import json
+import statistics
+
+from src.utils.retrieval_index import RetrievalIndex
+
+
+# Consultation-style queries, with the articles answering them
+QUERIES = [
+    ("mindfulness breathing exercises workplace stress", {"Mindfulness"}),
+    ("Mindfulness", {"Mindfulness"}),
+    ("mindfulness-based stress reduction", {"Mindfulness"}),
+    ("how to reduce stress in an open plan office", {"Open-plan office", "Occupational stress"}),
+    ("noise cancelling headphones open office concentration", {"Open-plan office"}),
+    ("Open-plan office", {"Open-plan office"}),
+    ("regular sleep schedule insomnia tips", {"Sleep hygiene"}),
+    ("Sleep hygiene", {"Sleep hygiene"}),
+    ("work stress management interventions", {"Occupational stress"}),
+    ("Occupational stress", {"Occupational stress"}),
+    ("cycling to work mental health", {"Cycling"}),
+    ("how to talk to my manager about workload", {"Occupational stress"}),
+    ("journaling gratitude before bed", set()),
+    ("nutrition hydration during the workday", set()),
+    ("yoga classes for beginners", set()),
+]
+
+ARTICLES = ["Mindfulness", "Open-plan office", "Sleep hygiene", "Occupational stress", "Cycling", "Photosynthesis"]
+
+
+def load_articles(path: str = None) -> list:
+    """Articles as cacheable Wikipedia results, from a JSONL file or fetched live."""
+
+    if path:
+        with open(path) as file:
+            docs = [json.loads(line) for line in file if line.strip()]
+        return [{"title": doc["title"], "page_content": doc["text"], "source": f"local:{doc['title']}"} for doc in docs]
+
+    from langchain_community.document_loaders import WikipediaLoader
+
+    results = []
+    for title in ARTICLES:
+        for doc in WikipediaLoader(query=title, load_max_docs=1, doc_content_chars_max=12000).load():
+            results.append({"title": title, "page_content": doc.page_content, "source": doc.metadata["source"]})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", help="JSONL file of articles instead of fetching Wikipedia")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.12, 0.15, 0.18, 0.2, 0.25, 0.3])
+    args = parser.parse_args()
+
+    articles = load_articles(args.docs)
+    index = RetrievalIndex()
+    index.add("wiki", articles)
+
+    relevant, unrelated = [], []
+    for query, answers in QUERIES:
+        for similarity, result in index.search("wiki", query, k=len(articles)):
+            (relevant if result["title"] in answers else unrelated).append(similarity)
+
+    for name, scores in (("relevant", relevant), ("unrelated", unrelated)):
+        if scores:
+            print(f"{name:<10} n={len(scores):<4} min {min(scores):.3f}  median {statistics.median(scores):.3f}  max {max(scores):.3f}")
+
+    print(f"\n{'threshold':>9} {'relevant found':>15} {'unrelated accepted':>19}")
+    for threshold in args.thresholds:
+        found = sum(score >= threshold for score in relevant) / len(relevant) if relevant else 0.0
+        accepted = sum(score >= threshold for score in unrelated) / len(unrelated) if unrelated else 0.0
+        print(f"{threshold:>9.2f} {found:>15.0%} {accepted:>19.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Evaluation of per-node model routes: output validity and latency of candidate models.
+
+Replays the prompts the selected LLM nodes received on each candidate model and reports, per node
+and model, the share of outputs that parse into the node's schema (or pass its format check) and
+the latency. Route decisions need real prompts and real models (--live, needs OPENAI_API_KEY):
+
+    # record the prompts of live runs of the graph on real problems (same JSONL as run_batch.py)
+    python -m benchmarks.evaluate_models --problems problems.jsonl --save-prompts prompts.jsonl --live --models gpt-4o-2024-11-20
+    # replay recorded prompts ({"node": ..., "messages": [{"role": ..., "content": ...}, ...]} per line)
+    python -m benchmarks.evaluate_models --prompts prompts.jsonl --live --models gpt-4o-2024-11-20 gpt-4.1-mini-2025-04-14
+
+Without --prompts or --problems, the prompts come from a run of the graph with stand-ins and are
+filler text, and without --live the candidates are stand-ins whose outputs always parse: both are
+only a smoke test of the harness, not an evaluation of the models.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import re
+import statistics
+import time
+from collections import defaultdict
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import convert_to_messages, convert_to_openai_messages
+from langgraph.types import Command
+
+from benchmarks.run_benchmarks import run_graph
+from benchmarks.stand_ins import Latency, StandInModelRegistry, stand_in_search_clients
+from src.graphs.wellbeing_assistant_graph import build_main_graph
+from src.schemas.models import SearchQueries, Steps
+from src.service.batch_runner import APPROVAL, read_problems
+from src.utils.logging_utils import init_timer
+from src.utils.model_registry import ModelRegistry
+from src.utils.model_routing import DEFAULT_MODEL_ROUTES, ModelRoutes
+from src.utils.plan_convergence import parse_plan_steps
+
+
+# Schemas of the nodes calling with_structured_output (an output that does not parse is invalid)
+STRUCTURED_OUTPUTS = {
+    "query_constructor": SearchQueries,
+    "plan_formatting": Steps,
+}
+
+# Validity checks of the parsed outputs and of the free-text answers, following the prompt instructions
+OUTPUT_CHECKS = {
+    "query_constructor": lambda queries: bool(queries.web_query.strip() and queries.wiki_query.strip()),
+    "plan_formatting": lambda plan: bool(plan.steps) and all(step.theme.strip() and step.helpful_tip.strip() for step in plan.steps),
+    "advice_planner": lambda text: bool(parse_plan_steps(text)),
+    "feedback_generator": lambda text: bool(text.strip()),
+    "question_generator": lambda text: bool(text.strip()),
+    "answer_generator": lambda text: bool(re.search(r"\[\d+\]", text)),
+    "generate_summary": lambda text: 0 < len(text.split()) <= 250,
+    "section_writer": lambda text: text.lstrip().startswith("## ") and "### Sources" in text,
+    "section_preprocessor": lambda text: 0 < len(text.split()) <= 50,
+    "plan_writer": lambda text: text.lstrip().startswith("#"),
+}
+
+
+class PromptRecorder(BaseCallbackHandler):
+    """Callback handler collecting the messages sent to the chat models, by graph node."""
+
+    def __init__(self):
+        self.prompts = defaultdict(list) # node -> list of message lists
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node in DEFAULT_MODEL_ROUTES:
+            self.prompts[node].extend(messages)
+
+
+def record_live_prompts(problems: list, max_steps: int, max_cycles: int, incremental_assembly: bool) -> dict:
+    """Run the live graph on real problems and return the prompts of every LLM node (needs the API keys).
+
+    The scripted feedback of each problem answers the plan review before the plan is approved, as in run_batch.py.
+    """
+
+    recorder = PromptRecorder()
+    graph = build_main_graph(incremental_assembly=incremental_assembly)
+
+    for problem in problems:
+        config = {"configurable": {"thread_id": f"evaluation-{problem['id']}"}, "callbacks": [recorder]}
+        feedback = list(problem.get("feedback", []))
+        graph_input = {"problem": problem["problem"], "max_steps": problem.get("max_steps", max_steps), "max_cycles": problem.get("max_cycles", max_cycles)}
+        while True:
+            result = graph.invoke(graph_input, config=config)
+            if not result.get("__interrupt__"):
+                break
+            graph_input = Command(resume=feedback.pop(0) if feedback else APPROVAL)
+
+    return recorder.prompts
+
+
+def save_prompts(prompts: dict, path: str):
+    with open(path, "w") as file:
+        for node, message_lists in prompts.items():
+            for messages in message_lists:
+                file.write(json.dumps({"node": node, "messages": convert_to_openai_messages(messages)}) + "\n")
+
+
+def load_prompts(path: str) -> dict:
+    """Prompts by node from a JSONL file of {"node": ..., "messages": [...]} records (OpenAI-style messages)."""
+
+    prompts = defaultdict(list)
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                prompts[record["node"]].append(convert_to_messages(record["messages"]))
+    return prompts
+
+
+def record_prompts(max_steps: int, max_cycles: int, incremental_assembly: bool) -> dict:
+    """Run the graph once with instant stand-ins and return the prompts of every LLM node (filler text, for smoke tests)."""
+
+    recorder = PromptRecorder()
+    config = {"configurable": {"thread_id": "evaluation"}, "callbacks": [recorder]}
+
+    with contextlib.redirect_stdout(io.StringIO()): # silence the progress logs
+        graph = build_main_graph(
+            model_registry=StandInModelRegistry(latency=Latency(0.0)),
+            search_clients=stand_in_search_clients(web_latency=Latency(0.0), wiki_latency=Latency(0.0)),
+            incremental_assembly=incremental_assembly,
+        )
+        asyncio.run(run_graph(graph, max_steps, max_cycles, config, async_mode=False))
+
+    return recorder.prompts
+
+
+def is_valid(node: str, output) -> bool:
+    return OUTPUT_CHECKS[node](output if node in STRUCTURED_OUTPUTS else output.text)
+
+
+def evaluate(node: str, model: str, prompts: list, registry: ModelRegistry) -> dict:
+    """Replay the recorded prompts of a node on a model."""
+
+    chat_model = ModelRoutes({node: model}).chat_model(node, registry)
+    runnable = chat_model.with_structured_output(STRUCTURED_OUTPUTS[node]) if node in STRUCTURED_OUTPUTS else chat_model
+
+    latencies, valid, errors = [], 0, 0
+    for prompt in prompts:
+        started = time.perf_counter()
+        try:
+            output = runnable.invoke(prompt)
+        except Exception:
+            # Unparseable structured output (or a failed request) counts as invalid
+            errors += 1
+        else:
+            valid += is_valid(node, output)
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "node": node,
+        "model": model,
+        "samples": len(prompts),
+        "valid_rate": round(valid / len(prompts), 3) if prompts else 0.0,
+        "errors": errors,
+        "latency_p50_s": round(statistics.median(latencies), 4) if latencies else 0.0,
+        "latency_p95_s": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))], 4) if latencies else 0.0,
+    }
+
+
+def print_report(results: list, smoke_test: bool = False):
+    if smoke_test:
+        print("SMOKE TEST: stand-in prompts or models, the validity rates say nothing about the candidate models\n")
+    print(f"{'node':<22} {'model':<26} {'samples':>7} {'valid':>6} {'errors':>6} {'p50 s':>7} {'p95 s':>7}")
+    for result in results:
+        print(
+            f"{result['node']:<22} {result['model']:<26} {result['samples']:>7} {result['valid_rate']:>6.0%} "
+            f"{result['errors']:>6} {result['latency_p50_s']:>7.3f} {result['latency_p95_s']:>7.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", nargs="+", default=sorted(STRUCTURED_OUTPUTS), choices=sorted(DEFAULT_MODEL_ROUTES))
+    parser.add_argument("--models", nargs="+", default=["gpt-4o-2024-11-20", "gpt-4.1-mini-2025-04-14"])
+    parser.add_argument("--max-steps", type=int, default=3, help="max_steps of the runs recording the prompts")
+    parser.add_argument("--max-cycles", type=int, default=4, help="max_cycles of the runs recording the prompts (generate_summary needs 4)")
+    parser.add_argument("--samples", type=int, default=20, help="prompts replayed per node")
+    parser.add_argument("--prompts", help="JSONL file of recorded prompts to replay")
+    parser.add_argument("--problems", help="JSONL file of real problems (as for run_batch.py) to record the prompts from live runs of the graph")
+    parser.add_argument("--save-prompts", help="write the recorded prompts to this JSONL file, to replay them with --prompts")
+    parser.add_argument("--live", action="store_true", help="replay the prompts on the real models instead of stand-ins")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="median stand-in latency (s)")
+    parser.add_argument("--stand-in-latency", nargs="*", default=[], metavar="MODEL=SECONDS", help="median stand-in latency of specific models")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    # Initialise START_TIME for the performance logs
+    init_timer()
+
+    # section_preprocessor only runs with incremental assembly
+    incremental_assembly = "section_preprocessor" in args.nodes
+    if args.prompts:
+        prompts = load_prompts(args.prompts)
+    elif args.problems:
+        prompts = record_live_prompts(read_problems(args.problems), args.max_steps, args.max_cycles, incremental_assembly)
+    else:
+        prompts = record_prompts(args.max_steps, args.max_cycles, incremental_assembly)
+    if args.save_prompts:
+        save_prompts(prompts, args.save_prompts)
+
+    latencies = {model: float(seconds) for model, seconds in (item.split("=", 1) for item in args.stand_in_latency)}
+    results = []
+    for model_number, model in enumerate(args.models):
+        registry = ModelRegistry() if args.live else StandInModelRegistry(latency=Latency(latencies.get(model, args.llm_latency), seed=model_number))
+        for node in args.nodes:
+            results.append(evaluate(node, model, prompts[node][:args.samples], registry))
+
+    results.sort(key=lambda result: (result["node"], result["model"]))
+    print_report(results, smoke_test=not args.live or not (args.prompts or args.problems))
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Offline benchmark of build_main_graph with stand-in LLM and search backends.
+
+Runs the full graph (auto-approving the plan at human_feedback) across a matrix of
+max_steps/max_cycles and reports wall-clock, per-node latency/queue wait/tokens, peak memory, state size
+(main graph and subgraph runs) and the bytes written by the checkpointer.
+
+    python -m benchmarks.run_benchmarks --max-steps 1 3 5 --max-cycles 1 2 3 --llm-latency 0.05
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import time
+import tracemalloc
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.types import Command
+
+from benchmarks.stand_ins import Latency, StandInModelRegistry, stand_in_search_clients
+from src.graphs.wellbeing_assistant_graph import build_main_graph
+from src.utils.logging_utils import init_timer
+from src.utils.metrics import MetricsRegistry
+from src.utils.coalescing import SearchCoalescer
+from src.utils.prefetch import SearchPrefetcher
+from src.utils.resilience import ResiliencePolicy
+from src.utils.retrieval_index import RetrievalIndex
+
+
+PROBLEM = "I'm feeling very stressed at work, because I don't like being surrounded by many people in an open office."
+
+
+def node_summary(metrics: MetricsRegistry) -> dict:
+    """Aggregate the per-node metrics over threads and themes."""
+
+    snapshot = metrics.to_json()
+    nodes = {}
+
+    for series in snapshot["histograms"].get("node_latency_seconds", []):
+        node = nodes.setdefault(series["labels"]["node"], {})
+        node["count"] = node.get("count", 0) + series["count"]
+        node["latency_total_s"] = node.get("latency_total_s", 0.0) + series["sum"]
+
+    for series in snapshot["histograms"].get("node_queue_wait_seconds", []):
+        node = nodes.setdefault(series["labels"]["node"], {})
+        node["queue_wait_total_s"] = node.get("queue_wait_total_s", 0.0) + series["sum"]
+
+    for name, key in (("llm_prompt_tokens_total", "prompt_tokens"), ("llm_completion_tokens_total", "completion_tokens")):
+        for series in snapshot["counters"].get(name, []):
+            node = nodes.setdefault(series["labels"]["node"], {})
+            node[key] = node.get(key, 0) + int(series["value"])
+
+    for node in nodes.values():
+        node["latency_mean_s"] = node.get("latency_total_s", 0.0) / node["count"] if node.get("count") else 0.0
+        for key, value in node.items():
+            if isinstance(value, float):
+                node[key] = round(value, 4)
+
+    return dict(sorted(nodes.items()))
+
+
+def state_size(checkpointer: MemorySaver, thread_id: str) -> int:
+    """Size in bytes of the serialised final states of a thread: the main graph's and those of its subgraph runs."""
+
+    serializer = JsonPlusSerializer()
+    size = 0
+    for namespace in checkpointer.storage[thread_id]:
+        checkpoint = checkpointer.get_tuple({"configurable": {"thread_id": thread_id, "checkpoint_ns": namespace}}).checkpoint
+        _, payload = serializer.dumps_typed(checkpoint["channel_values"])
+        size += len(payload)
+    return size
+
+
+def checkpoint_size(checkpointer: MemorySaver, thread_id: str) -> int:
+    """Bytes the checkpointer stored for a thread over the whole run (checkpoints, channel values and pending writes)."""
+
+    size = 0
+    for checkpoints in checkpointer.storage[thread_id].values():
+        for checkpoint, metadata, _ in checkpoints.values():
+            size += len(checkpoint[1]) + len(metadata[1])
+    size += sum(len(payload) for (thread, *_), (_, payload) in checkpointer.blobs.items() if thread == thread_id)
+    size += sum(
+        len(value[1])
+        for (thread, *_), writes in checkpointer.writes.items() if thread == thread_id
+        for _, _, value, _ in writes.values()
+    )
+    return size
+
+
+async def run_graph(graph, max_steps: int, max_cycles: int, config: dict, async_mode: bool):
+    """Run the graph to completion, approving the plan at every interrupt."""
+
+    graph_input = {"problem": PROBLEM, "max_steps": max_steps, "max_cycles": max_cycles}
+    while True:
+        if async_mode:
+            result = await graph.ainvoke(graph_input, config=config)
+        else:
+            result = await asyncio.to_thread(graph.invoke, graph_input, config=config)
+        if not result.get("__interrupt__"):
+            return result
+        graph_input = Command(resume="No feedback")
+
+
+def benchmark(max_steps: int, max_cycles: int, args, run_number: int) -> dict:
+    """Build and run the graph once with stand-in backends, returning its measurements."""
+
+    registry = StandInModelRegistry(latency=Latency(args.llm_latency, args.latency_sigma, seed=run_number))
+    search_clients = stand_in_search_clients(
+        web_latency=Latency(args.search_latency, args.latency_sigma, seed=run_number + 1),
+        wiki_latency=Latency(args.search_latency, args.latency_sigma, seed=run_number + 2),
+    )
+
+    metrics = MetricsRegistry()
+    prefetcher = SearchPrefetcher(similarity_threshold=args.prefetch_threshold) if args.prefetch else None
+    coalescer = SearchCoalescer()
+    resilience = ResiliencePolicy(hedge_min_samples=10) if args.resilience else None
+    checkpointer = MemorySaver()
+    thread_id = f"benchmark-{run_number}"
+    config = {"configurable": {"thread_id": thread_id}}
+
+    with contextlib.redirect_stdout(io.StringIO()): # silence the progress logs
+
+        graph = build_main_graph(async_mode=args.async_mode, model_registry=registry, search_clients=search_clients, metrics=metrics, prefetcher=prefetcher, retrieval_index=args.retrieval_index, search_coalescer=coalescer, resilience=resilience, checkpointer=checkpointer)
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        asyncio.run(run_graph(graph, max_steps, max_cycles, config, args.async_mode))
+        wall_clock = time.perf_counter() - started
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "max_steps": max_steps,
+        "max_cycles": max_cycles,
+        "wall_clock_s": round(wall_clock, 4),
+        "peak_memory_kb": round(peak_memory / 1024, 1),
+        "state_size_kb": round(state_size(checkpointer, thread_id) / 1024, 1),
+        "checkpoint_kb": round(checkpoint_size(checkpointer, thread_id) / 1024, 1),
+        "nodes": node_summary(metrics),
+        "searches": coalescer.stats(),
+        "resilience": resilience.stats() if resilience else None,
+        "prefetch": prefetcher.stats() if prefetcher else None,
+        "retrieval": args.retrieval_index.stats() if args.retrieval_index else None, # cumulative over the runs
+    }
+
+
+def print_report(results: list):
+    print(f"{'steps':>5} {'cycles':>6} {'wall s':>8} {'peak KB':>9} {'state KB':>9} {'stored KB':>9}  slowest nodes (total s)")
+    for result in results:
+        slowest = sorted(result["nodes"].items(), key=lambda item: item[1].get("latency_total_s", 0.0), reverse=True)[:3]
+        slowest = ", ".join(f"{node} {stats.get('latency_total_s', 0.0):.2f}" for node, stats in slowest)
+        print(
+            f"{result['max_steps']:>5} {result['max_cycles']:>6} {result['wall_clock_s']:>8.2f} "
+            f"{result['peak_memory_kb']:>9.1f} {result['state_size_kb']:>9.1f} {result['checkpoint_kb']:>9.1f}  {slowest}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-steps", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--max-cycles", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="median stand-in LLM latency (s)")
+    parser.add_argument("--search-latency", type=float, default=0.03, help="median stand-in search latency (s)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread of the latencies")
+    parser.add_argument("--async", dest="async_mode", action="store_true", help="benchmark build_main_graph(async_mode=True)")
+    parser.add_argument("--prefetch", action="store_true", help="speculatively prefetch the consultation searches")
+    parser.add_argument("--prefetch-threshold", type=float, default=0.4, help="query similarity needed to use a prefetched result")
+    parser.add_argument("--resilience", action="store_true", help="apply deadlines, retries and hedging to the searches")
+    parser.add_argument("--retrieval", action="store_true", help="share a local retrieval index between the runs")
+    parser.add_argument("--json", help="write the full results to this file")
+    args = parser.parse_args()
+    args.retrieval_index = RetrievalIndex() if args.retrieval else None
+
+    # Initialise START_TIME for the performance logs
+    init_timer()
+
+    results = [
+        benchmark(max_steps, max_cycles, args, run_number)
+        for run_number, (max_steps, max_cycles) in enumerate(itertools.product(args.max_steps, args.max_cycles))
+    ]
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
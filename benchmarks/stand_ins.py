@@ -0,0 +1,223 @@
+"""Deterministic stand-ins for ChatOpenAI, TavilySearch and WikipediaLoader.
+
+They reproduce the shape of the real responses (plan steps, cited answers, sections with Sources,
+structured outputs) with configurable latency, so the graph can be benchmarked offline.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from src.utils.model_registry import ModelRegistry
+
+
+VOCABULARY = (
+    "breathing routine boundaries colleagues headphones quiet rooms walking posture sleep hygiene "
+    "journaling gratitude nutrition hydration stretching meditation mindfulness therapy counselling "
+    "workload priorities calendar breaks sunlight exercise cycling yoga pilates relaxation noise "
+    "lighting plants manager flexible remote schedule support network hobbies reading music"
+).split()
+
+
+class Latency:
+    """Log-normal latency distribution described by its median and spread (sigma), seeded for repeatability."""
+
+    def __init__(self, median: float = 0.05, sigma: float = 0.5, seed: int = 0):
+        self.median = median
+        self.sigma = sigma
+        self._random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return self._random.lognormvariate(0.0, self.sigma) * self.median
+
+
+def _words(seed_text: str, count: int) -> str:
+    """Deterministic filler words derived from the prompt."""
+
+    rng = random.Random(hashlib.sha256(seed_text.encode("utf-8")).hexdigest())
+    return " ".join(rng.choice(VOCABULARY) for _ in range(count))
+
+
+def _text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else json.dumps(message.content)
+
+
+class StandInChatModel(BaseChatModel):
+    """Chat model returning node-appropriate, deterministic replies after a sampled delay."""
+
+    model_name: str = "stand-in"
+    latency: Any = None # Latency instance
+    tokens_per_reply: int = 120
+
+    @property
+    def _llm_type(self) -> str:
+        return "stand-in"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name}
+
+    def _reply(self, messages: List[BaseMessage], structured_schema=None) -> str:
+        system = _text(messages[0]) if messages else ""
+        prompt = "\n".join(_text(message) for message in messages)
+
+        if structured_schema is not None:
+            return json.dumps(self._structured(structured_schema, prompt))
+
+        if "planning a wellbeing action plan" in system:
+            max_steps = int(re.search(r"Max steps: (\d+)", system).group(1))
+            return "Proposed steps:\n\n" + "\n\n".join(
+                f"- Step -\nTheme: {_words(prompt + str(i), 2).title()}\nHelpful tip: Try {_words(prompt + 'tip' + str(i), 12)}."
+                for i in range(max_steps)
+            )
+        if "providing feedback for wellbeing action plans" in system:
+            return "No changes required for the plan."
+        if "You are a client" in system:
+            return f"Thanks. How would I put {_words(prompt, 6)} into practice at work?"
+        if "expert wellbeing practitioner" in system:
+            sources = list(dict.fromkeys(re.findall(r"<Document source: ([^,]+),", system)))[:3]
+            citations = " ".join(f"[{number}]" for number in range(1, len(sources) + 1))
+            listed = "\n".join(f"[{number}] {source}" for number, source in enumerate(sources, start=1))
+            return f"You could focus on {_words(prompt, 40)} {citations}\n\n{listed}"
+        if "summarising conversations" in system:
+            return f"The client asked about {_words(prompt, 30)}."
+        if "short and actionable section" in system:
+            theme = re.search(r"Theme: (.+)", system)
+            sources = list(dict.fromkeys(re.findall(r"\[\d+\] (https?://\S+)", system)))[:4]
+            listed = "  \n".join(f"[{number}] {source}" for number, source in enumerate(sources, start=1))
+            return (
+                f"## {theme.group(1) if theme else 'Step'}\n\n### Summary\n\n{_words(system, 120)} [1]\n\n"
+                f"### Sources\n{listed}"
+            )
+        if "single sentence" in system:
+            return f"Practise {_words(prompt, 12)}."
+        if "polished version of a Wellbeing Action Plan" in system:
+            sections = re.findall(r"^\s*## (?!Their|Pre-written)(.+)$", system, re.M)
+            body = "\n\n".join(f"## {title}\n\n{_words(system + title, 80)} [1]" for title in sections)
+            return f"# Personalised Wellbeing Action Plan\n\n## Summary\n\n{_words(system, 40)}\n\n{body}"
+
+        return _words(prompt, self.tokens_per_reply // 2)
+
+    def _structured(self, schema, prompt: str) -> dict:
+        if "steps" in schema.model_fields:
+            steps = re.findall(r"Theme: (.+)\nHelpful tip: (.+)", prompt)
+            return {"steps": [{"theme": theme, "helpful_tip": tip} for theme, tip in steps]}
+        return {
+            name: [_words(prompt + name + str(i), 5) for i in range(2)] if field.annotation == List[str] else _words(prompt + name, 5)
+            for name, field in schema.model_fields.items()
+        }
+
+    def _result(self, messages: List[BaseMessage], **kwargs) -> ChatResult:
+        content = self._reply(messages, kwargs.get("structured_schema"))
+        input_tokens = sum(len(_text(message)) for message in messages) // 4
+        output_tokens = len(content) // 4
+        message = AIMessage(
+            content=content,
+            usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens},
+            response_metadata={"model_name": self.model_name},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency.sample() if self.latency else 0.0)
+        return self._result(messages, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency.sample() if self.latency else 0.0)
+        return self._result(messages, **kwargs)
+
+    def with_structured_output(self, schema, **kwargs):
+        # Go through _generate (and thus callbacks and caches) like the real structured output does
+        return self.bind(structured_schema=schema) | RunnableLambda(lambda message: schema.model_validate_json(message.content))
+
+
+class StandInModelRegistry(ModelRegistry):
+    """Model registry handing out StandInChatModel instances sharing one latency distribution."""
+
+    def __init__(self, latency: Optional[Latency] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency or Latency()
+
+    def _create_model(self, model: str, **kwargs) -> StandInChatModel:
+        kwargs.pop("temperature", None)
+        return StandInChatModel(model_name=model, latency=self.latency, **kwargs)
+
+
+class StandInTavilySearch:
+    """Stand-in for langchain_tavily.TavilySearch."""
+
+    latency = Latency(median=0.3)
+
+    def __init__(self, max_results: int = 5, **kwargs):
+        self.max_results = max_results
+
+    def _results(self, query: str) -> dict:
+        slug = re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-")
+        return {
+            "query": query,
+            "results": [
+                {
+                    "url": f"https://example.org/{slug}/{number}",
+                    "title": f"{query} ({number})",
+                    "content": _words(query + str(number), 60),
+                    "raw_content": _words(query + "raw" + str(number), 1200),
+                }
+                for number in range(self.max_results)
+            ],
+        }
+
+    def invoke(self, input: str, **kwargs) -> dict:
+        time.sleep(self.latency.sample())
+        return self._results(input)
+
+    async def ainvoke(self, input: str, **kwargs) -> dict:
+        await asyncio.sleep(self.latency.sample())
+        return self._results(input)
+
+
+class StandInWikipediaLoader:
+    """Stand-in for langchain_community.document_loaders.WikipediaLoader."""
+
+    latency = Latency(median=0.3)
+
+    def __init__(self, query: str, load_max_docs: int = 25, doc_content_chars_max: int = 4000, **kwargs):
+        self.query = query
+        self.load_max_docs = load_max_docs
+        self.doc_content_chars_max = doc_content_chars_max
+
+    def _documents(self) -> List[Document]:
+        return [
+            Document(
+                page_content=_words(self.query + str(number), 800)[:self.doc_content_chars_max],
+                metadata={"source": f"https://en.wikipedia.org/wiki/{self.query.replace(' ', '_')}_{number}", "title": f"{self.query} {number}"},
+            )
+            for number in range(self.load_max_docs)
+        ]
+
+    def load(self) -> List[Document]:
+        time.sleep(self.latency.sample())
+        return self._documents()
+
+    async def aload(self) -> List[Document]:
+        await asyncio.sleep(self.latency.sample())
+        return self._documents()
+
+
+def stand_in_search_clients(web_latency: Optional[Latency] = None, wiki_latency: Optional[Latency] = None) -> tuple:
+    """Search clients for build_main_graph(search_clients=...): the stand-in classes, with their own latencies if given."""
+
+    web_search = StandInTavilySearch if web_latency is None else type("StandInTavilySearch", (StandInTavilySearch,), {"latency": web_latency})
+    wiki_loader = StandInWikipediaLoader if wiki_latency is None else type("StandInWikipediaLoader", (StandInWikipediaLoader,), {"latency": wiki_latency})
+    return web_search, wiki_loader
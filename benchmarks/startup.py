@@ -0,0 +1,79 @@
+"""Startup benchmark: cold import and graph build times, measured in fresh interpreter processes.
+
+    python -m benchmarks.startup --repeat 5
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+
+# Each snippet prints the seconds it took, measured inside a fresh interpreter
+SNIPPETS = {
+    "import graph module": """
+import time
+started = time.perf_counter()
+import src.graphs.wellbeing_assistant_graph
+print(time.perf_counter() - started)
+""",
+    "import + build_main_graph": """
+import time
+started = time.perf_counter()
+from benchmarks.stand_ins import StandInModelRegistry
+from src.graphs.wellbeing_assistant_graph import build_main_graph
+build_main_graph(model_registry=StandInModelRegistry())
+print(time.perf_counter() - started)
+""",
+    "first search client use": """
+import time
+from src.graphs.subgraphs.consultation_subgraph import load_search_clients
+started = time.perf_counter()
+load_search_clients()
+print(time.perf_counter() - started)
+""",
+}
+
+# Measured in this process: rebuilding the graph vs reusing the cached compiled graph
+IN_PROCESS = """
+import json, time
+from benchmarks.stand_ins import StandInModelRegistry
+from src.graphs.wellbeing_assistant_graph import build_main_graph, get_main_graph
+registry = StandInModelRegistry()
+timings = {}
+started = time.perf_counter(); build_main_graph(model_registry=registry); timings["build_main_graph (rebuild)"] = time.perf_counter() - started
+get_main_graph(model_registry=registry)
+started = time.perf_counter(); get_main_graph(model_registry=registry); timings["get_main_graph (cached)"] = time.perf_counter() - started
+print(json.dumps(timings))
+"""
+
+
+def run_snippet(code: str) -> str:
+    return subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout.strip().splitlines()[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="fresh processes per measurement")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in SNIPPETS.items():
+        results[name] = statistics.median(float(run_snippet(code)) for _ in range(args.repeat))
+
+    in_process = [json.loads(run_snippet(IN_PROCESS)) for _ in range(args.repeat)]
+    for name in in_process[0]:
+        results[name] = statistics.median(timings[name] for timings in in_process)
+
+    for name, seconds in results.items():
+        print(f"{name:<30} {seconds * 1000:>9.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Batch mode: generate Wellbeing Action Plans for a JSONL file of problems.
+
+Each input line is a JSON object with a "problem" and optional "id", "max_steps", "max_cycles" and
+"feedback" (list of scripted answers to the plan review; the plan is approved afterwards). Results are
+appended to the output JSONL as they finish; re-running the same command skips the problems already done
+there and retries the failed ones.
+
+    python run_batch.py problems.jsonl plans.jsonl --workers 16
+"""
+
+# Load environment variables
+from pathlib import Path
+from dotenv import load_dotenv
+
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path, override=True)
+
+# Imports
+import argparse
+import asyncio
+from src.graphs.wellbeing_assistant_graph import build_main_graph
+from src.service.batch_runner import BatchRunner, read_problems
+from src.utils.checkpointing import SQLiteCheckpointer
+from src.utils.llm_cache import LLMResponseCache
+from src.utils.logging_utils import init_timer, log
+from src.utils.search_cache import SQLiteSearchCache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of problems")
+    parser.add_argument("output", help="JSONL file the plans are appended to")
+    parser.add_argument("--workers", type=int, default=8, help="problems processed concurrently")
+    parser.add_argument("--max-steps", type=int, default=3, help="default max_steps of a problem")
+    parser.add_argument("--checkpoints", help="SQLite file used to resume in-flight problems (default: .cache/batch_checkpoints.sqlite)")
+    parser.add_argument("--llm-cache", help="SQLite file of the LLM response cache (default: .cache/llm_cache.sqlite)")
+    parser.add_argument("--search-cache", help="SQLite file of the search cache (default: .cache/search_cache.sqlite)")
+    parser.add_argument("--stand-ins", action="store_true", help="run offline with the benchmark stand-ins (default files under .cache/stand_ins/)")
+    args = parser.parse_args()
+
+    # Stand-in answers and documents must never be served to live runs from the shared caches
+    cache_dir = ".cache/stand_ins" if args.stand_ins else ".cache"
+    checkpoints = args.checkpoints or f"{cache_dir}/batch_checkpoints.sqlite"
+    llm_cache = args.llm_cache or f"{cache_dir}/llm_cache.sqlite"
+    search_cache = args.search_cache or f"{cache_dir}/search_cache.sqlite"
+
+    # Initialise START_TIME for the performance logs
+    init_timer()
+
+    model_registry, search_clients = None, None
+    if args.stand_ins:
+        from benchmarks.stand_ins import StandInModelRegistry, stand_in_search_clients
+        model_registry, search_clients = StandInModelRegistry(), stand_in_search_clients()
+
+    graph = build_main_graph(
+        async_mode=True,
+        model_registry=model_registry,
+        search_clients=search_clients,
+        llm_cache=LLMResponseCache(llm_cache),
+        search_cache=SQLiteSearchCache(search_cache),
+        checkpointer=SQLiteCheckpointer(checkpoints),
+    )
+
+    runner = BatchRunner(graph, workers=args.workers, max_steps=args.max_steps)
+    counts = asyncio.run(runner.run(read_problems(args.input), args.output))
+
+    log(f"[Batch] Finished: {counts['done']} plans successfully generated, {counts['error']} errors, {counts['skipped']} already done")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,17 +6,58 @@ env_path = Path(__file__).parent / ".env"
 load_dotenv(dotenv_path=env_path, override=True)
 
 # Imports
-from src.graphs.wellbeing_assistant_graph import build_main_graph
+from src.graphs.wellbeing_assistant_graph import get_main_graph
 from src.utils.logging_utils import init_timer
 import os
+import uuid
 from termcolor import colored 
 from langgraph.types import Command
 from rich.console import Console
+from rich.live import Live
 from rich.markdown import Markdown
 from rich.theme import Theme
 
 
-def main(initial_input):
+def stream_graph(graph, graph_input, config, console):
+
+    """Stream the graph until it finishes or gets interrupted, rendering the final plan as Markdown while its tokens arrive."""
+
+    interrupts = None
+    final_plan = ""
+    live = None
+
+    try:
+        for mode, chunk in graph.stream(graph_input, config=config, stream_mode=["messages", "updates"]):
+            
+            # Tokens generated by the LLM inside the plan_writer node
+            if mode == "messages":
+                message, metadata = chunk
+                if metadata.get("langgraph_node") == "plan_writer" and message.text:
+                    # Start rendering with the first token
+                    if live is None:
+                        live = Live(console=console, refresh_per_second=8, vertical_overflow="visible")
+                        live.start()
+                    final_plan += message.text
+                    live.update(Markdown(final_plan))
+
+            # Interrupts raised by the human_feedback node
+            elif "__interrupt__" in chunk:
+                interrupts = chunk["__interrupt__"]
+
+            # The finished plan (with the consolidated Sources section appended after the LLM call)
+            elif (chunk.get("plan_writer") or {}).get("final_plan"):
+                if live is None:
+                    console.print(Markdown(chunk["plan_writer"]["final_plan"]))
+                else:
+                    live.update(Markdown(chunk["plan_writer"]["final_plan"]))
+    finally:
+        if live is not None:
+            live.stop()
+
+    return interrupts
+
+
+def main(initial_input, stream=True, thread_id=None, checkpointer=None):
     
     # Verify if all environment variables are loaded
     required_vars = ["OPENAI_API_KEY", "TAVILY_API_KEY"] 
@@ -26,17 +67,40 @@ def main(initial_input):
         raise ValueError(colored(f"Missing required environment variables: {missing_vars}", "red"))
         sys.exit(1) # Exit the application
 
-    # In-memory checkpointer
-    thread = {'configurable': {"thread_id": "1"}}
+    # A new thread per run, unless an existing thread of a durable checkpointer (e.g. SQLiteCheckpointer) is resumed
+    thread = {'configurable': {"thread_id": thread_id or str(uuid.uuid4())}}
+
+    # Get the main graph (compiled once per process)
+    graph = get_main_graph(checkpointer=checkpointer)
 
-    # create the main graph
-    graph = build_main_graph()
+    # Continue an interrupted run of this thread from its last checkpoint, otherwise start with the problem
+    graph_input = None if graph.get_state(thread).next else {"problem": initial_input, "max_steps": 3}
     
     # Initialise START_TIME for the performance logs
     init_timer()
 
+    # Prepare render to Markdown
+    custom_theme = Theme({
+    "markdown.h1": "bold yellow",
+    "markdown.h2": "bold yellow"
+    })
+
+    console = Console(theme=custom_theme)
+
+    # Streaming run: the final plan is rendered token by token
+    if stream:
+        interrupts = stream_graph(graph, graph_input, thread, console)
+
+        # Keep processing interruptions until "No feedback" is input by the user
+        while interrupts:
+            print(interrupts[0].value)
+            user_input = input("Provide your response or type " + colored("No feedback", "yellow") + " if you approve the plan" + "\n> ")
+            interrupts = stream_graph(graph, Command(resume=user_input), thread, console)
+
+        return
+
     # Initial run
-    result = graph.invoke({"problem": initial_input, "max_steps": 3}, config=thread)
+    result = graph.invoke(graph_input, config=thread)
     
     # Keep processing interruptions until "No feedback" is input by the user
     while result.get("__interrupt__", ""):
@@ -51,13 +115,6 @@ def main(initial_input):
         # Resume and get new result
         result = graph.invoke(Command(resume=user_input), config=thread)
 
-    # Prepare render to Markdown
-    custom_theme = Theme({
-    "markdown.h1": "bold yellow",
-    "markdown.h2": "bold yellow"
-    })
-
-    console = Console(theme=custom_theme)
     md = Markdown(result["final_plan"])
     console.print(md)     
 
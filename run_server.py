@@ -0,0 +1,59 @@
+"""HTTP service serving the Wellbeing Assistant graph to many users from one process.
+
+    python run_server.py --port 8080
+    python run_server.py --stand-ins  # offline, with the benchmark stand-ins instead of OpenAI/Tavily/Wikipedia
+"""
+
+# Load environment variables
+from pathlib import Path
+from dotenv import load_dotenv
+
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path, override=True)
+
+# Imports
+import argparse
+import json
+from aiohttp import web
+from src.graphs.wellbeing_assistant_graph import build_main_graph
+from src.service.http_service import create_app
+from src.utils.checkpointing import SQLiteCheckpointer
+from src.utils.logging_utils import init_timer
+from src.utils.metrics import MetricsRegistry
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-concurrent-runs", type=int, default=32)
+    parser.add_argument("--per-tenant-runs", type=int, default=4, help="concurrent runs allowed per tenant")
+    parser.add_argument("--api-keys", help='JSON file mapping API keys to tenants ({"key": "tenant", ...}); all requests share one tenant if omitted')
+    parser.add_argument("--checkpoints", help="SQLite file for durable checkpoints (in memory if omitted)")
+    parser.add_argument("--stand-ins", action="store_true", help="serve the graph with the offline benchmark stand-ins")
+    args = parser.parse_args()
+
+    # Initialise START_TIME for the performance logs
+    init_timer()
+
+    model_registry, search_clients = None, None
+    if args.stand_ins:
+        from benchmarks.stand_ins import StandInModelRegistry, stand_in_search_clients
+        model_registry, search_clients = StandInModelRegistry(), stand_in_search_clients()
+
+    # The graph is compiled once and shared by all threads
+    metrics = MetricsRegistry()
+    checkpointer = SQLiteCheckpointer(args.checkpoints) if args.checkpoints else None
+    graph = build_main_graph(async_mode=True, model_registry=model_registry, metrics=metrics, checkpointer=checkpointer, search_clients=search_clients)
+
+    api_keys = None
+    if args.api_keys:
+        with open(args.api_keys) as file:
+            api_keys = json.load(file)
+
+    app = create_app(graph, max_concurrent_runs=args.max_concurrent_runs, per_tenant_runs=args.per_tenant_runs, metrics=metrics, api_keys=api_keys)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,34 @@
 from src.utils.logging_utils import log
+from src.utils.metrics import MetricsRegistry
+from src.utils.model_registry import ModelRegistry
+from src.utils.model_routing import ModelRoutes
+from src.utils.plan_convergence import plan_change
 from src.schemas.models import Step, Steps
 from src.schemas.states import AdvicePlanningState, PlanningOutputState
 
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import interrupt
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from typing import List
+from typing import List, Optional
+from langchain_core.caches import BaseCache
 from termcolor import colored
 
 
 
 
-def build_planner_subgraph():
+def build_planner_subgraph(async_mode: bool = False, llm_cache: Optional[BaseCache] = None, model_registry: Optional[ModelRegistry] = None, convergence_threshold: Optional[float] = 0.1, metrics: Optional[MetricsRegistry] = None, model_routes: Optional[ModelRoutes] = None):
 
-    # Instatiate chat model
-    llm_4o = ChatOpenAI(model="gpt-4o-2024-11-20", temperature=0) 
+    """Build the advice planning subgraph. With async_mode=True, LLM-calling nodes are native coroutines using ainvoke.
+    An optional llm_cache replays responses to identical (temperature=0) LLM calls. Chat models come from model_registry
+    (or the process-wide default registry), so their connection pools are shared with the other subgraphs; model_routes picks each node's model.
+    The planner/feedback loop stops early once successive drafts change less than convergence_threshold (None disables it);
+    converged loops and the cycles they saved are counted in the optional metrics registry."""
+
+    # Get the shared chat models of the nodes
+    model_routes = model_routes or ModelRoutes()
+    planner_llm = model_routes.chat_model("advice_planner", model_registry, llm_cache)
+    feedback_llm = model_routes.chat_model("feedback_generator", model_registry, llm_cache)
+    formatting_llm = model_routes.chat_model("plan_formatting", model_registry, llm_cache)
 
     # Nodes and edges
 
@@ -63,10 +76,10 @@ def build_planner_subgraph():
     12. CRUICIAL: Make sure you don't exceed maximum number of steps in suggested plan. Max steps: {max_steps}. 
     """
 
-    def advice_planner(state: AdvicePlanningState):
-        
-        """Advice-planning node"""
-        
+    def advice_planner_inputs(state: AdvicePlanningState):
+
+        """Update the counters and format the messages for the advice_planner node."""
+
         cycles_counter = state.get("cycles_counter", -1)
         user_feedback = state.get("user_feedback", False)
         
@@ -99,17 +112,45 @@ def build_planner_subgraph():
         if len(conversation) > 5:
             conversation = conversation[-5:]
 
-        plan = llm_4o.invoke(messages + conversation)
+        return messages + conversation, cycles_counter, user_feedback
+
+    def advice_planner_update(state: AdvicePlanningState, plan, cycles_counter, user_feedback):
+
+        """Return the drafted plan together with the incremented counter and how much it changed since the previous draft."""
 
         # Increment the counter
         cycles_counter += 1
 
+        # Only drafts revised after AI feedback are compared (the first draft of a loop has nothing to converge to)
+        change = plan_change(state["plan"], plan.content) if cycles_counter > 0 and state.get("plan") else None
+
         return {
             "messages": [plan], 
             "plan": plan.content,
+            "plan_change": change,
             "cycles_counter": cycles_counter,
             "user_feedback": user_feedback
             }
+
+    def advice_planner(state: AdvicePlanningState):
+        
+        """Advice-planning node"""
+
+        messages, cycles_counter, user_feedback = advice_planner_inputs(state)
+        
+        plan = planner_llm.invoke(messages)
+
+        return advice_planner_update(state, plan, cycles_counter, user_feedback)
+
+    async def aadvice_planner(state: AdvicePlanningState):
+
+        """Async variant of the advice_planner node."""
+
+        messages, cycles_counter, user_feedback = advice_planner_inputs(state)
+
+        plan = await planner_llm.ainvoke(messages)
+
+        return advice_planner_update(state, plan, cycles_counter, user_feedback)
     
 
     feedback_instructions = """# Identity and objectives: 
@@ -153,9 +194,9 @@ def build_planner_subgraph():
 
     """
 
-    def feedback_generator(state: AdvicePlanningState):
-        
-        """Node providing feedback for the advice_planner."""
+    def feedback_messages(state: AdvicePlanningState):
+
+        """Format the messages for the feedback_generator node."""
 
         problem = state['problem']
         conversation = state['messages']
@@ -167,7 +208,22 @@ def build_planner_subgraph():
         if len(conversation) > 5:
             conversation = conversation[-5:]
 
-        feedback = llm_4o.invoke([SystemMessage(content=sys_message)] + conversation)
+        return [SystemMessage(content=sys_message)] + conversation
+
+    def feedback_generator(state: AdvicePlanningState):
+        
+        """Node providing feedback for the advice_planner."""
+
+        feedback = feedback_llm.invoke(feedback_messages(state))
+        feedback.name = "planner"
+
+        return {'messages': [feedback]}
+
+    async def afeedback_generator(state: AdvicePlanningState):
+
+        """Async variant of the feedback_generator node."""
+
+        feedback = await feedback_llm.ainvoke(feedback_messages(state))
         feedback.name = "planner"
 
         return {'messages': [feedback]}
@@ -196,6 +252,18 @@ def build_planner_subgraph():
             log("[Planner] Draft successfully generated!")
             
             return "human_feedback"
+
+        # Route to the human feedback step if the last revision barely changed the plan
+        elif convergence_threshold is not None and state.get("plan_change") is not None and state["plan_change"] < convergence_threshold:
+
+            # Print progress log
+            log(f"[Planner] Draft converged ({state['plan_change']:.0%} changed), plan successfully generated!")
+
+            if metrics is not None:
+                metrics.increment("planner_converged_total", help="Planning loops stopped early because the drafts converged.")
+                metrics.increment("planner_cycles_saved_total", max_cycles - cycles_counter, help="Feedback/planning cycles skipped thanks to convergence.")
+
+            return "human_feedback"
         # Otherwise, continue with AI feedback generation 
         else:
             return "feedback_generator"
@@ -254,20 +322,29 @@ def build_planner_subgraph():
         
         plan = state['plan']
         
-        structured_llm = llm_4o.with_structured_output(Steps)
+        structured_llm = formatting_llm.with_structured_output(Steps)
         structured_plan = structured_llm.invoke([formatting_instructions] + [AIMessage(content=plan)])
 
         return {"steps": structured_plan.steps}
 
+    async def aplan_formatting(state: AdvicePlanningState):
+
+        """Async variant of the plan_formatting node."""
+
+        structured_llm = formatting_llm.with_structured_output(Steps)
+        structured_plan = await structured_llm.ainvoke([formatting_instructions] + [AIMessage(content=state['plan'])])
+
+        return {"steps": structured_plan.steps}
+
     
     # Build the subgraph
 
     # Add nodes
     builder = StateGraph(state_schema=AdvicePlanningState, output_schema=PlanningOutputState)
-    builder.add_node("advice_planner", advice_planner)
-    builder.add_node("feedback_generator", feedback_generator)
+    builder.add_node("advice_planner", aadvice_planner if async_mode else advice_planner)
+    builder.add_node("feedback_generator", afeedback_generator if async_mode else feedback_generator)
     builder.add_node("human_feedback", human_feedback)
-    builder.add_node("plan_formatting", plan_formatting)
+    builder.add_node("plan_formatting", aplan_formatting if async_mode else plan_formatting)
 
     # Add edges (logic)
     builder.add_edge(START, "advice_planner")
@@ -1,25 +1,74 @@
-from src.schemas.models import SearchQuery
+from src.schemas.models import SearchQueries
 from src.schemas.states import ConsultationState, ConsultationOutputState
 from src.utils.logging_utils import log
-
-from langchain_openai import ChatOpenAI
-from langgraph.graph import StateGraph, START, END
-from langgraph.types import interrupt, Send, Command
+from src.utils.model_registry import ModelRegistry
+from src.utils.model_routing import ModelRoutes
+from src.utils.search_cache import SearchCache, search_cache_key
+from src.utils.coalescing import SearchCoalescer, default_coalescer
+from src.utils.resilience import ResiliencePolicy
+from src.utils.plan_assembly import parse_section
+from src.utils.source_docs import DOC_SEPARATOR, cycle_documents, source_doc
+from src.utils.prompt_budget import PromptBudgets, count_tokens, count_message_tokens, fit_documents, fit_recent_messages, fit_recent_texts
+from src.utils.prefetch import SearchPrefetcher, predict_search_queries
+from src.utils.passages import join_passages, top_passages
+
+from langgraph.graph import StateGraph, START
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from langchain_core.messages import get_buffer_string, RemoveMessage
-from typing import List, Sequence
-from langchain_tavily import TavilySearch
-from langchain_community.document_loaders import WikipediaLoader
+from langchain_core.runnables import RunnableConfig
+from typing import TYPE_CHECKING, List, Optional, Sequence
+from langchain_core.caches import BaseCache
+
+if TYPE_CHECKING:
+    from src.utils.retrieval_index import RetrievalIndex # numpy is only imported when an index is used
+
+
+# Search clients, imported on first use by load_search_clients() (langchain_tavily and langchain_community are slow to import)
+TavilySearch = None
+WikipediaLoader = None
+
+
+def load_search_clients():
+
+    """Import the search client classes unless they are already loaded."""
+
+    global TavilySearch, WikipediaLoader
 
+    if TavilySearch is None:
+        from langchain_tavily import TavilySearch
+    if WikipediaLoader is None:
+        from langchain_community.document_loaders import WikipediaLoader
 
+    return TavilySearch, WikipediaLoader
 
 
 
-def build_consultation_subgraph():
 
-    # Instatiate chat models
-    llm_4o = ChatOpenAI(model="gpt-4o-2024-11-20", temperature=0) 
-    llm_4_1_mini = ChatOpenAI(model="gpt-4.1-mini-2025-04-14", temperature=0)
+def build_consultation_subgraph(async_mode: bool = False, search_cache: Optional[SearchCache] = None, llm_cache: Optional[BaseCache] = None, model_registry: Optional[ModelRegistry] = None, incremental_assembly: bool = False, prefetcher: Optional[SearchPrefetcher] = None, alternative_queries: int = 0, prompt_budgets: Optional[PromptBudgets] = None, retrieval_index: Optional["RetrievalIndex"] = None, search_coalescer: Optional[SearchCoalescer] = None, resilience: Optional[ResiliencePolicy] = None, model_routes: Optional[ModelRoutes] = None, search_clients: Optional[tuple] = None):
+
+    """Build the consultation subgraph. With async_mode=True, I/O-bound nodes are native coroutines using ainvoke/aload.
+    An optional search_cache is shared by the websearch and wikisearch nodes, and an optional llm_cache by all LLM calls.
+    Chat models come from model_registry (or the process-wide default registry), chosen per node by model_routes (defaults to ModelRoutes()).
+    With incremental_assembly=True, each branch pre-processes its section for the final plan as soon as it is written.
+    With a prefetcher, every cycle speculatively starts the searches for predicted queries while the questions and queries are generated.
+    The web and Wikipedia queries come from one structured call, optionally with alternative_queries fallback web queries.
+    The answer_generator and section_writer prompts are trimmed to the token budgets of prompt_budgets (defaults to PromptBudgets()).
+    With a retrieval_index, the search nodes first look for relevant documents fetched earlier and only search live when none is similar enough.
+    Concurrent identical or near-identical searches of all branches are merged by search_coalescer (defaults to the process-wide coalescer).
+    With a resilience policy, every outbound search gets a deadline, retries and hedged duplicates.
+    search_clients is a (web search class, Wikipedia loader class) pair used instead of TavilySearch and WikipediaLoader."""
+
+    search_coalescer = search_coalescer or default_coalescer
+    prompt_budgets = prompt_budgets or PromptBudgets()
+
+    # Get the shared chat models of the nodes
+    model_routes = model_routes or ModelRoutes()
+    question_llm = model_routes.chat_model("question_generator", model_registry, llm_cache)
+    query_llm = model_routes.chat_model("query_constructor", model_registry, llm_cache)
+    answer_llm = model_routes.chat_model("answer_generator", model_registry, llm_cache)
+    summary_llm = model_routes.chat_model("generate_summary", model_registry, llm_cache)
+    section_llm = model_routes.chat_model("section_writer", model_registry, llm_cache)
+    preprocessor_llm = model_routes.chat_model("section_preprocessor", model_registry, llm_cache)
   
     # Nodes and edges
 
@@ -47,9 +96,9 @@ def build_consultation_subgraph():
     6. IMPORTANT: When you feel you don't need more information and all your questions have been answered, finish the consultation by stating: "Thank you and goodbye!"   
     """
 
-    def question_generator(state: ConsultationState):
-        
-        """Node to genarate a question for a single step in the wellbeing action plan."""
+    def question_messages(state: ConsultationState):
+
+        """Format the messages for the question_generator node."""
 
         problem = state["problem"]
         step = state["step"]
@@ -67,7 +116,24 @@ def build_consultation_subgraph():
             AIMessage(content="Hello! What brings you here today?", name="practitioner") # Prompt the simulated conversation
         ]
 
-        question = llm_4o.invoke(messages + conversation)
+        return messages + conversation
+
+    def question_generator(state: ConsultationState, config: RunnableConfig):
+        
+        """Node to genarate a question for a single step in the wellbeing action plan."""
+
+        prefetch_searches(state, config)
+        question = question_llm.invoke(question_messages(state))
+        question.name = "client"
+
+        return {"messages": [question]}
+
+    async def aquestion_generator(state: ConsultationState, config: RunnableConfig):
+
+        """Async variant of the question_generator node."""
+
+        prefetch_searches(state, config)
+        question = await question_llm.ainvoke(question_messages(state))
         question.name = "client"
 
         return {"messages": [question]}
@@ -83,13 +149,13 @@ def build_consultation_subgraph():
             # Jump to answer_generation node
             return "answer_generator"
         else:
-            # Continue with the parallel web and wiki search
-            return ["web_query_constructor", "wiki_query_constructor"]
+            # Construct the queries for the parallel web and wiki search
+            return "query_constructor"
 
 
-    web_query_instructions = """# Identity and objectives:
-    You are an assistant specialised in creating quality and well-structured search queries for use in web-search. 
-    You will be given a conversation between a client and a wellbeing practitioner and your goal is to create a query based on that conversation. 
+    query_instructions = """# Identity and objectives:
+    You are an assistant specialised in creating quality and well-structured search queries for use in web search and in Wikipedia search. 
+    You will be given a conversation between a client and a wellbeing practitioner and your goal is to create both queries based on that conversation. 
 
     # Follow these steps:
     1. Analyse the problem the client came to discuss with the practitioner:
@@ -102,88 +168,93 @@ def build_consultation_subgraph():
     {summary}
 
     4. IMPORTANT: Pay particular attention to the final question posed by the client.
-    5. Convert this final question into a well-structured web search query"""
+    5. Convert this final question into a well-structured web search query.
+    6. Convert this final question into a well-structured Wikipedia search query. When constructing it, use these pointers:
+    * Use specific, unique terms - Search "Fermi paradox" instead of "aliens exist"
+    * Include proper names when known - Search "Marie Curie radium" instead of "female scientist radioactivity"
+    * Add disambiguating context for common terms - Search "Python programming" instead of just "Python"
+    * Use the most common name or spelling - Search "World War II" instead of "Second World War" or "WW2"
+    * Combine key concepts with AND - Search "Einstein AND photoelectric" instead of "Einstein's work on light"
+    * Keep the queries short.
+    7. {alternatives}
+    """
 
-    def web_query_constructor(state: ConsultationState):
-        
-        """Node to construct a web search query according to the expected output schema."""
+    def query_messages(state: ConsultationState):
+
+        """Format the messages for the query_constructor node."""
 
         problem = state["problem"]
         conversation = state["messages"]
         summary = state.get("summary", "")
 
-        formatted_query_instructions = web_query_instructions.format(
+        if alternative_queries:
+            alternatives = f"Provide {alternative_queries} alternative web search queries phrased differently from the main one."
+        else:
+            alternatives = "Leave the alternative web search queries empty."
+
+        formatted_query_instructions = query_instructions.format(
             problem=problem,
-            summary=summary
+            summary=summary,
+            alternatives=alternatives
         )
 
-        # Force output format
-        structured_llm = llm_4o.with_structured_output(SearchQuery)
-        # Generate the query
-        query = structured_llm.invoke([formatted_query_instructions] + conversation)
+        return [formatted_query_instructions] + conversation
 
-        return {"webquery": query.search_query}
+    def query_update(queries: SearchQueries):
 
+        """Return the web and Wikipedia queries (and the alternative web queries) for the search nodes."""
 
-    wiki_query_instructions = """# Identity and objectives:
-    You are an assistant specialised in creating quality and well-structured search queries for use in Wikipedia search. 
-    You will be given a conversation between a client and a wellbeing practitioner and your goal is to create a query based on that conversation. 
+        return {
+            "webquery": queries.web_query,
+            "wikiquery": queries.wiki_query,
+            "webquery_alternatives": queries.alternative_web_queries[:alternative_queries]
+            }
 
-    # Follow these steps:
-    1. Analyse the problem the client came to discuss with the practitioner:
+    def query_constructor(state: ConsultationState):
+        
+        """Node to construct both the web and the Wikipedia search queries in a single structured call."""
 
-    {problem}
+        # Force output format
+        structured_llm = query_llm.with_structured_output(SearchQueries)
+        # Generate the queries
+        queries = structured_llm.invoke(query_messages(state))
 
-    2. Analyse the conversation.
-    3. Analyse (optional) summary of the previous parts of the conversation:
+        return query_update(queries)
 
-    {summary}
+    async def aquery_constructor(state: ConsultationState):
 
-    4. IMPORTANT: Pay particular attention to the final question posed by the client.
-    5. Convert this final question into a well-structured Wikipedia search query
-    6. When constructing the query, use these pointers:
-    * Use specific, unique terms - Search "Fermi paradox" instead of "aliens exist"
-    * Include proper names when known - Search "Marie Curie radium" instead of "female scientist radioactivity"
-    * Add disambiguating context for common terms - Search "Python programming" instead of just "Python"
-    * Use the most common name or spelling - Search "World War II" instead of "Second World War" or "WW2"
-    * Combine key concepts with AND - Search "Einstein AND photoelectric" instead of "Einstein's work on light"
-    * Keep the queries short.
-    """
-    def wiki_query_constructor(state: ConsultationState):
-        
-        """Node to construct a Wikipedia search query according to the expected output schema."""
+        """Async variant of the query_constructor node."""
 
-        problem = state["problem"]
-        conversation = state["messages"]
-        summary = state.get("summary", "")
+        structured_llm = query_llm.with_structured_output(SearchQueries)
+        queries = await structured_llm.ainvoke(query_messages(state))
 
-        formatted_query_instructions = wiki_query_instructions.format(
-            problem=problem,
-            summary=summary
-        )
+        return query_update(queries)
 
-        structured_llm = llm_4o.with_structured_output(SearchQuery)
-        query = structured_llm.invoke([formatted_query_instructions] + conversation)
 
-        return {"wikiquery": query.search_query}
+    # Search settings (also part of the search cache key)
+    web_max_results = 2
+    wiki_max_docs = 2
+    doc_content_chars_max = 12000 # Whole pages (up to this size) are fetched, then only their most relevant passages are kept
+    passage_chars = 500
+    passages_per_doc = 3
 
+    def tavily_search():
 
-    def websearch(state: ConsultationState):
-        
-        "Node to perform the websearch with constructed query and to save the source docs"
-        
-        webquery = state["webquery"]
+        """Instantiate the Tavily search tool used by the websearch node."""
+
+        TavilySearch, _ = search_clients or load_search_clients()
 
-        tavily = TavilySearch(
-            max_results=2,
+        return TavilySearch(
+            max_results=web_max_results,
             topic="general",
             include_raw_content=True # For more data
             )
-        
-        # Run the web search and return docs
-        docs = tavily.invoke(input=webquery)
 
-        def raw_content_snippet(doc, max_length=1500):
+    def web_results(docs):
+
+        """Convert the Tavily response into a list of cacheable documents."""
+
+        def raw_content_snippet(doc, max_length=doc_content_chars_max):
             
             """Limit the length of the scraped raw content."""
             
@@ -197,39 +268,265 @@ def build_consultation_subgraph():
             else:
                 return ""
 
-        # Format all returned docs
-        formatted_docs = "\n\n-----\n\n".join(
-            [
-                f'<Document source: {doc["url"]}, title: "{doc["title"]}"/>\n\n{doc.get("content", "")}\n\n{raw_content_snippet(doc)}\n</Document>'
-                for doc in docs['results']
-            ]
-        )
+        return [
+            {"url": doc["url"], "title": doc["title"], "content": doc.get("content", ""), "raw_content": raw_content_snippet(doc)}
+            for doc in docs['results']
+        ]
+
+    def client_question(state: ConsultationState):
+
+        """The client's latest question, which the passages of the fetched documents are ranked against."""
+
+        return state["messages"][-1].text if state.get("messages") else state["step"].step_summary
+
+    def relevant_passages(text: str, state: ConsultationState):
+
+        """Keep the passages of a fetched page most relevant to the client's question."""
+
+        return join_passages(top_passages(client_question(state), text, k=passages_per_doc, max_chars=passage_chars))
+
+    def format_web_docs(results, state: ConsultationState):
+
+        """Format the documents returned by the Tavily search for the source_docs store."""
+
+        return [
+            source_doc(doc["url"], doc["title"], f'<Document source: {doc["url"]}, title: "{doc["title"]}"/>\n\n{doc["content"]}\n\n{relevant_passages(doc["raw_content"], state)}\n</Document>', state.get("cycles_counter", 0))
+            for doc in results
+        ]
+
+    def resilient_call(operation: str, fetch):
+
+        """Run a blocking search through the resilience policy, if any."""
+
+        return fetch() if resilience is None else resilience.call(operation, fetch)
+
+    async def aresilient_call(operation: str, afetch):
+
+        """Async variant of resilient_call."""
+
+        return await (afetch() if resilience is None else resilience.acall(operation, afetch))
+
+    def web_cache_key(webquery: str):
+        return search_cache_key("web", webquery, web_max_results, doc_content_chars_max)
+
+    def search_web(webquery: str):
+
+        """Run the web search (through the search cache, if any) and return the cacheable documents."""
+
+        def fetch_web():
+            return resilient_call("tavily", lambda: web_results(tavily_search().invoke(input=webquery)))
+
+        # Concurrent branches searching for the same query share one outbound call
+        fetch = lambda: search_coalescer.run("web", webquery, fetch_web)
+
+        if search_cache is None:
+            return fetch()
+        return search_cache.get_or_fetch(web_cache_key(webquery), fetch)
+
+    async def asearch_web(webquery: str):
+
+        """Async variant of search_web."""
 
-        return {"source_docs": [formatted_docs]}
+        async def afetch():
+            return web_results(await aresilient_call("tavily", lambda: tavily_search().ainvoke(input=webquery)))
 
+        async def acoalesced_fetch():
+            return await search_coalescer.arun("web", webquery, afetch)
 
-    def wikisearch(state: ConsultationState):
+        if search_cache is None:
+            return await acoalesced_fetch()
+        return await search_cache.aget_or_fetch(web_cache_key(webquery), acoalesced_fetch)
+
+    def websearch(state: ConsultationState, config: RunnableConfig):
         
-        "Node to perform Wikipedia search with constructed query and to save the source docs"
+        "Node to perform the websearch with constructed query and to save the source docs"
+        
+        webquery = state["webquery"]
 
-        wikiquery = state["wikiquery"]
+        # Answer from the documents fetched earlier if relevant ones are indexed
+        results = local_results(state, "web", webquery, web_max_results)
+        if results is not None:
+            return {"source_docs": format_web_docs(results, state)}
+
+        # Use the speculative results if they were prefetched for a similar query
+        if prefetcher is not None:
+            results = prefetcher.take(branch_key(state, config), "web", webquery)
+        if results is None:
+            results = search_web(webquery)
+
+        # Fall back to the alternative queries if the main one found nothing
+        for alternative in state.get("webquery_alternatives", []):
+            if results:
+                break
+            results = search_web(alternative)
+
+        index_results("web", results)
+
+        return {"source_docs": format_web_docs(results, state)}
+
+    async def awebsearch(state: ConsultationState, config: RunnableConfig):
+
+        """Async variant of the websearch node."""
+
+        webquery = state["webquery"]
+
+        results = local_results(state, "web", webquery, web_max_results)
+        if results is not None:
+            return {"source_docs": format_web_docs(results, state)}
+
+        if prefetcher is not None:
+            results = await prefetcher.atake(branch_key(state, config), "web", webquery)
+        if results is None:
+            results = await asearch_web(webquery)
 
-        # Run the wiki search and return found docs
-        docs = WikipediaLoader(
+        for alternative in state.get("webquery_alternatives", []):
+            if results:
+                break
+            results = await asearch_web(alternative)
+
+        index_results("web", results)
+
+        return {"source_docs": format_web_docs(results, state)}
+
+
+    def wikipedia_loader(wikiquery: str):
+
+        """Instantiate the Wikipedia loader used by the wikisearch node."""
+
+        _, WikipediaLoader = search_clients or load_search_clients()
+
+        return WikipediaLoader(
             query=wikiquery, 
-            load_max_docs=2, 
-            doc_content_chars_max=1500
-            ).load() 
+            load_max_docs=wiki_max_docs, 
+            doc_content_chars_max=doc_content_chars_max
+            )
+
+    def wiki_results(docs):
+
+        """Convert the loaded Wikipedia pages into a list of cacheable documents."""
+
+        return [
+            {"source": doc.metadata["source"], "title": doc.metadata["title"], "page_content": doc.page_content}
+            for doc in docs
+        ]
+
+    def format_wiki_docs(results, state: ConsultationState):
+
+        """Format the documents returned by the Wikipedia loader for the source_docs store."""
+
+        return [
+            source_doc(doc["source"], doc["title"], f'<Document source: {doc["source"]}, title: "{doc["title"]}"/>\n{relevant_passages(doc["page_content"], state)}\n</Document>', state.get("cycles_counter", 0))
+            for doc in results
+        ]
+
+    def wiki_cache_key(wikiquery: str):
+        return search_cache_key("wiki", wikiquery, wiki_max_docs, doc_content_chars_max)
+
+    def search_wiki(wikiquery: str):
+
+        """Run the Wikipedia search (through the search cache, if any) and return the cacheable documents."""
+
+        def fetch_wiki():
+            return resilient_call("wikipedia", lambda: wiki_results(wikipedia_loader(wikiquery).load()))
+
+        fetch = lambda: search_coalescer.run("wiki", wikiquery, fetch_wiki)
+
+        if search_cache is None:
+            return fetch()
+        return search_cache.get_or_fetch(wiki_cache_key(wikiquery), fetch)
+
+    async def asearch_wiki(wikiquery: str):
+
+        """Async variant of search_wiki."""
+
+        # The wikipedia client is blocking, so aload() offloads it to the default executor
+        async def afetch():
+            return wiki_results(await aresilient_call("wikipedia", lambda: wikipedia_loader(wikiquery).aload()))
+
+        async def acoalesced_fetch():
+            return await search_coalescer.arun("wiki", wikiquery, afetch)
+
+        if search_cache is None:
+            return await acoalesced_fetch()
+        return await search_cache.aget_or_fetch(wiki_cache_key(wikiquery), acoalesced_fetch)
+
+    def wikisearch(state: ConsultationState, config: RunnableConfig):
         
-        # Format all returned docs
-        formatted_docs = "\n\n-----\n\n".join(
-            [
-                f'<Document source: {doc.metadata["source"]}, title: "{doc.metadata["title"]}"/>\n{doc.page_content}\n</Document>'
-                for doc in docs
-            ]
-        )
+        "Node to perform Wikipedia search with constructed query and to save the source docs"
+
+        wikiquery = state["wikiquery"]
+
+        # Answer from the documents fetched earlier if relevant ones are indexed
+        results = local_results(state, "wiki", wikiquery, wiki_max_docs)
+        if results is not None:
+            return {"source_docs": format_wiki_docs(results, state)}
+
+        # Use the speculative results if they were prefetched for a similar query
+        if prefetcher is not None:
+            results = prefetcher.take(branch_key(state, config), "wiki", wikiquery)
+        if results is None:
+            results = search_wiki(wikiquery)
+
+        index_results("wiki", results)
+
+        return {"source_docs": format_wiki_docs(results, state)}
+
+    async def awikisearch(state: ConsultationState, config: RunnableConfig):
+
+        """Async variant of the wikisearch node."""
+
+        wikiquery = state["wikiquery"]
+
+        results = local_results(state, "wiki", wikiquery, wiki_max_docs)
+        if results is not None:
+            return {"source_docs": format_wiki_docs(results, state)}
+
+        if prefetcher is not None:
+            results = await prefetcher.atake(branch_key(state, config), "wiki", wikiquery)
+        if results is None:
+            results = await asearch_wiki(wikiquery)
+
+        index_results("wiki", results)
+
+        return {"source_docs": format_wiki_docs(results, state)}
+
+
+    def local_results(state: ConsultationState, source: str, query: str, k: int):
 
-        return {"source_docs": [formatted_docs]}
+        """Indexed results relevant to the query (skipping the documents this consultation already has), or None to search live."""
+
+        if retrieval_index is None:
+            return None
+        known_sources = [doc["source"] for doc in state.get("source_docs", [])]
+        return retrieval_index.lookup(source, query, k, exclude=known_sources)
+
+    def index_results(source: str, results):
+
+        """Add the results of a live (or prefetched) search to the retrieval index."""
+
+        if retrieval_index is not None:
+            retrieval_index.add(source, results)
+
+    def branch_key(state: ConsultationState, config: RunnableConfig):
+
+        """Identify a consultation branch across its cycles (one branch per thread and step)."""
+
+        thread_id = config.get("configurable", {}).get("thread_id", "")
+        return f"{thread_id}:{state['step'].step_summary}"
+
+    def prefetch_searches(state: ConsultationState, config: RunnableConfig):
+
+        """Speculatively start the searches of the coming cycle for queries predicted from the step and the running summary."""
+
+        if prefetcher is None:
+            return
+
+        webquery, wikiquery = predict_search_queries(state["step"], state.get("summary", ""))
+        key = branch_key(state, config)
+
+        # The prefetcher's threads run the blocking search clients (and fill the search cache, if any)
+        prefetcher.prefetch(key, "web", webquery, lambda: search_web(webquery))
+        prefetcher.prefetch(key, "wiki", wikiquery, lambda: search_wiki(wikiquery))
 
 
     answer_instructions = """# Identity and objectives:
@@ -264,62 +561,112 @@ def build_consultation_subgraph():
     10. Make sure to include the source the whole domain, so don't skip the 'https://'        
     10. Skip the addition of the brackets as well as the Document source preamble in your citation.""" 
 
-    def answer_generator(state: ConsultationState):
-    
-        "Node to generate the practitioner's answer based on the source docs."
-        
+    def answer_messages(state: ConsultationState):
+
+        """Format the messages for the answer_generator node with web/wiki docs."""
+
         problem = state["problem"]
-        context = "\n\n-----\n\n".join([doc for doc in state["source_docs"][-2:]]) # Only include the last two docs (Web + Wiki)
+        documents = cycle_documents(state["source_docs"], state.get("cycles_counter", 0)) # Only include the docs of the current cycle (Web + Wiki)
         summary = state.get("summary", "")
         conversation = state["messages"]
-        latest_message = conversation[-1]
-        cycles_counter = state.get("cycles_counter", 0)
 
+        # Fit the documents, summary and conversation in the node's token budget
+        budget = prompt_budgets.allocate(
+            "answer_generator",
+            answer_instructions.format(problem=problem, context="", summary=""),
+            {"documents": count_tokens(DOC_SEPARATOR.join(documents)), "summary": count_tokens(summary), "conversation": count_message_tokens(conversation)}
+        )
+        question = conversation[-1].text if conversation else ""
+        context = DOC_SEPARATOR.join(fit_documents(documents, budget["documents"], query=question)) # The documents most relevant to the client's latest question come first
+        summary = fit_recent_texts([summary], budget["summary"])[0] if summary else summary
+        conversation = fit_recent_messages(conversation, budget["conversation"])
+
+        formatted_answer_instructions = answer_instructions.format(
+            problem=problem,
+            context=context,
+            summary=summary
+        )
+
+        sys_message = [SystemMessage(content=formatted_answer_instructions)]
+
+        return sys_message + conversation
+
+    def consultation_concluded(state: ConsultationState):
+
+        """Check if the client concluded the consultation with the latest message."""
+
+        return "Thank you and goodbye!" in state["messages"][-1].content
+
+    def goodbye_answer(state: ConsultationState):
+
+        """Add a mock goodbye message from the practitioner without invoking the LLM."""
+
+        return {
+            "messages": [AIMessage(content="If you have any more questions in the future or need further support, don't hesitate to reach out. Take care and goodbye!", name="practitioner")],
+            "cycles_counter": state.get("cycles_counter", 0) + 1
+            }
+
+    def answer_generator(state: ConsultationState):
+    
+        "Node to generate the practitioner's answer based on the source docs."
+        
         # If consultation was concluded, add a mock goodbye message from the practitioner and don't invoke the LLM
-        if "Thank you and goodbye!" in latest_message.content:
-            cycles_counter += 1
-            return {
-                "messages": [AIMessage(content="If you have any more questions in the future or need further support, don't hesitate to reach out. Take care and goodbye!", name="practitioner")],
-                "cycles_counter": cycles_counter
-                }
+        if consultation_concluded(state):
+            return goodbye_answer(state)
+        
         # Otherwise, format the answer with web/wiki docs and invoke the LLM to generate the answer
-        else:
-            formatted_answer_instructions = answer_instructions.format(
-                problem=problem,
-                context=context,
-                summary=summary
-            )
+        answer = answer_llm.invoke(answer_messages(state))
+        answer.name = "practitioner"
+
+        return {
+            "messages": [answer],
+            "cycles_counter": state.get("cycles_counter", 0) + 1
+            }
+
+    async def aanswer_generator(state: ConsultationState):
+
+        """Async variant of the answer_generator node."""
+
+        if consultation_concluded(state):
+            return goodbye_answer(state)
+
+        answer = await answer_llm.ainvoke(answer_messages(state))
+        answer.name = "practitioner"
+
+        return {
+            "messages": [answer],
+            "cycles_counter": state.get("cycles_counter", 0) + 1
+            }
+
 
-            sys_message = [SystemMessage(content=formatted_answer_instructions)]
+    def turn_record(message):
 
-            answer = llm_4o.invoke(sys_message + conversation)
-            answer.name = "practitioner"
+        """Compact transcript entry for a message (speaker, text and message id)."""
 
-            cycles_counter += 1
+        speaker = message.name or get_buffer_string([message]).split(":", 1)[0]
+        return {"speaker": speaker, "text": message.content, "id": message.id}
 
-            return {
-                "messages": [answer],
-                "cycles_counter": cycles_counter
-                }
+    def render_transcript(turns):
 
+        """Render the transcript turn records for the section_writer prompt."""
+
+        return "\n".join(f"{turn['speaker']}: {turn['text']}" for turn in turns)
 
     def save_the_transcript(state: ConsultationState):
         
-        """Node to save the consultation transcript."""
+        """Node to append the latest turns to the consultation transcript."""
         
         conversation = state["messages"]
-        transcript = state.get("transcript", "")
 
         # Include the last round of conversation between the client and the practitioner
-        if transcript:
-            new_entries = get_buffer_string(conversation[-2:]) 
+        if state.get("transcript"):
+            new_entries = conversation[-2:]
         # If the transcript is still empty
         else:
-            new_entries = get_buffer_string([AIMessage(content="Hello! What brings you here today?", name="practitioner")] + conversation)
-
-        transcript += f"\n{new_entries}"
+            new_entries = [AIMessage(content="Hello! What brings you here today?", name="practitioner")] + conversation
 
-        return {"transcript": transcript}
+        # The node returns only the new turns and the transcript reducer appends them (SQLiteCheckpointer stores only the new turns)
+        return {"transcript": [turn_record(message) for message in new_entries]}
 
 
     def continue_consultation(state: ConsultationState):
@@ -352,6 +699,13 @@ def build_consultation_subgraph():
     5. Do not exceed 200 words.
     """
 
+    def summary_update(summary, conversation):
+
+        """Only keep the last round of conversation between the client and the practitioner."""
+
+        messages_to_remove = [RemoveMessage(id=message.id) for message in conversation[:4]]
+        return {"summary": summary.content, "messages": messages_to_remove}
+
     def generate_summary(state: ConsultationState):
         
         """Node to generate a summary of the consultation if it runs too long."""
@@ -363,13 +717,22 @@ def build_consultation_subgraph():
 
         # Summarise the consultation to save on tokens
         if len(conversation) >= 6:
-            summary = llm_4_1_mini.invoke([summary_instructions_formatted] + conversation)
-            # Only keep the last round of conversation between the client and the practitioner
-            messages_to_remove = [RemoveMessage(id=message.id) for message in conversation[:4]]
-            return {"summary": summary.content, "messages": messages_to_remove}
+            summary = summary_llm.invoke([summary_instructions_formatted] + conversation)
+            return summary_update(summary, conversation)
         else:
             pass
 
+    async def agenerate_summary(state: ConsultationState):
+
+        """Async variant of the generate_summary node."""
+
+        conversation = state["messages"]
+        summary_instructions_formatted = summary_instructions.format(summary=state.get("summary", ""))
+
+        if len(conversation) >= 6:
+            summary = await summary_llm.ainvoke([summary_instructions_formatted] + conversation)
+            return summary_update(summary, conversation)
+
     section_writer_instructions = """# Identity and objectives:
     You are an expert technical writer. 
     Your task is to create a short and actionable section of a Wellbeing Action Plan focused on a specific step from the plan while considering the problem reported by a client. 
@@ -441,14 +804,21 @@ def build_consultation_subgraph():
     - Include no preamble before the title of the Wellbeing Action Plan
     - Check that all guidelines have been followed"""
 
-    def section_writer(state: ConsultationState):
-        
-        """Node to write an actionable entry for the wellbeing action plan based on the consultation transcript."""
+    def section_messages(state: ConsultationState):
+
+        """Format the messages for the section_writer node."""
 
         step = state["step"]
-        theme = step.theme
-        transcript = state["transcript"]
         problem = state["problem"]
+
+        # Keep the latest turns of the transcript fitting in the node's token budget
+        turns = [render_transcript([turn]) for turn in state["transcript"]]
+        budget = prompt_budgets.allocate(
+            "section_writer",
+            section_writer_instructions.format(step=step.step_summary, transcript="") + problem,
+            {"transcript": count_tokens("\n".join(turns))}
+        )
+        transcript = "\n".join(fit_recent_texts(turns, budget["transcript"]))
     
         formatted_writing_instructions = section_writer_instructions.format(
             step=step.step_summary,
@@ -459,7 +829,13 @@ def build_consultation_subgraph():
             SystemMessage(content=formatted_writing_instructions),
             HumanMessage(content=f"Write a section for my Wellbeing Action Plan, in the context of my problem: {problem}")
         ]
-        section = llm_4o.invoke(messages)
+        return messages
+
+    def section_update(section, state: ConsultationState):
+
+        """Log the progress and return the written section."""
+
+        theme = state["step"].theme
 
         # print progress log
         if section.content:
@@ -467,30 +843,87 @@ def build_consultation_subgraph():
 
         return {"sections": [section.content]}
 
+    def section_writer(state: ConsultationState):
+        
+        """Node to write an actionable entry for the wellbeing action plan based on the consultation transcript."""
+
+        section = section_llm.invoke(section_messages(state))
+
+        return section_update(section, state)
+
+    async def asection_writer(state: ConsultationState):
+
+        """Async variant of the section_writer node."""
+
+        section = await section_llm.ainvoke(section_messages(state))
+
+        return section_update(section, state)
+
+
+    section_summary_instructions = """# Identity and objectives:
+    You are an expert technical writer preparing the Summary section of a Wellbeing Action Plan.
+
+    # Follow these steps:
+    1. Review the section of the plan below.
+    2. Write a single sentence (up to 40 words) outlining the step the section recommends.
+    3. Output only the sentence, with no citations and no preamble.
+
+    Section:
+
+    {section}
+    """
+
+    def section_preprocessor(state: ConsultationState):
+
+        """Node to pre-process the written section for the final plan (parsed parts and a summary sentence)."""
+
+        section = state["sections"][-1]
+        summary = preprocessor_llm.invoke([SystemMessage(content=section_summary_instructions.format(section=section))])
+
+        return {"section_parts": [{**parse_section(section), "summary": summary.content.strip()}]}
+
+    async def asection_preprocessor(state: ConsultationState):
+
+        """Async variant of the section_preprocessor node."""
+
+        section = state["sections"][-1]
+        summary = await preprocessor_llm.ainvoke([SystemMessage(content=section_summary_instructions.format(section=section))])
+
+        return {"section_parts": [{**parse_section(section), "summary": summary.content.strip()}]}
+
 
     # build the subgraph
 
+    # Pick the sync or async variant of each I/O-bound node
+    nodes = {
+        "question_generator": (question_generator, aquestion_generator),
+        "query_constructor": (query_constructor, aquery_constructor),
+        "websearch": (websearch, awebsearch),
+        "wikisearch": (wikisearch, awikisearch),
+        "answer_generator": (answer_generator, aanswer_generator),
+        "save_the_transcript": (save_the_transcript, save_the_transcript),
+        "generate_summary": (generate_summary, agenerate_summary),
+        "section_writer": (section_writer, asection_writer),
+    }
+    if incremental_assembly:
+        nodes["section_preprocessor"] = (section_preprocessor, asection_preprocessor)
+
     # Add nodes
     builder = StateGraph(state_schema=ConsultationState, output_schema=ConsultationOutputState)
-    builder.add_node(question_generator)
-    builder.add_node(web_query_constructor)
-    builder.add_node(wiki_query_constructor)
-    builder.add_node(websearch)
-    builder.add_node(wikisearch)
-    builder.add_node(answer_generator)
-    builder.add_node(save_the_transcript)
-    builder.add_node(generate_summary)
-    builder.add_node(section_writer)
+    for name, (sync_node, async_node) in nodes.items():
+        builder.add_node(name, async_node if async_mode else sync_node)
 
     # Add edges (logic)
     builder.add_edge(START, "question_generator")
-    builder.add_conditional_edges("question_generator", skip_the_search, ["answer_generator", "wiki_query_constructor", "web_query_constructor"])
-    builder.add_edge("wiki_query_constructor", "wikisearch")
-    builder.add_edge("web_query_constructor", "websearch")
+    builder.add_conditional_edges("question_generator", skip_the_search, ["answer_generator", "query_constructor"])
+    builder.add_edge("query_constructor", "websearch")
+    builder.add_edge("query_constructor", "wikisearch")
     builder.add_edge(["websearch", "wikisearch"], "answer_generator")
     builder.add_edge("answer_generator", "save_the_transcript")
     builder.add_conditional_edges("save_the_transcript", continue_consultation, ["generate_summary", "section_writer"])
     builder.add_edge("generate_summary", "question_generator")
+    if incremental_assembly:
+        builder.add_edge("section_writer", "section_preprocessor")
 
     # Compile the subgraph and return
     return builder.compile()
\ No newline at end of file
@@ -1,21 +1,51 @@
 from src.graphs.subgraphs.advice_planning_subgraph import build_planner_subgraph 
 from src.graphs.subgraphs.consultation_subgraph import build_consultation_subgraph
-from src.schemas.models import Step
 from src.schemas.states import OverallState, PlanningOutputState
-from src.utils.logging_utils import log, init_timer
-from pathlib import Path
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI 
+from src.utils.logging_utils import log
+from src.utils.metrics import MetricsCallbackHandler, MetricsRegistry
+from src.utils.model_registry import ModelRegistry
+from src.utils.model_routing import ModelRoutes
+from src.utils.search_cache import SearchCache
+from src.utils.coalescing import SearchCoalescer
+from src.utils.resilience import ResiliencePolicy
+from src.utils.prefetch import SearchPrefetcher
+from src.utils.prompt_budget import PromptBudgets
+from src.utils.plan_assembly import find_duplicate_sections, merge_sources, missing_sources, parse_section, sources_section, stitch_plan, strip_sources
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Send
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import SystemMessage, AIMessage
-
-
-def build_main_graph():
-
-    # Instantiate chat model
-    llm_5_mini = ChatOpenAI(model="gpt-5-mini-2025-08-07", temperature=0)
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
+from langchain_core.caches import BaseCache
+
+if TYPE_CHECKING:
+    from src.utils.retrieval_index import RetrievalIndex # numpy is only imported when an index is used
+
+
+def build_main_graph(async_mode: bool = False, search_cache: Optional[SearchCache] = None, llm_cache: Optional[BaseCache] = None, model_registry: Optional[ModelRegistry] = None, incremental_assembly: bool = False, metrics: Optional[MetricsRegistry] = None, prefetcher: Optional[SearchPrefetcher] = None, alternative_queries: int = 0, checkpointer: Optional[BaseCheckpointSaver] = None, convergence_threshold: Optional[float] = 0.1, prompt_budgets: Optional[PromptBudgets] = None, retrieval_index: Optional["RetrievalIndex"] = None, search_coalescer: Optional[SearchCoalescer] = None, resilience: Optional[ResiliencePolicy] = None, model_routes: Optional[ModelRoutes] = None, search_clients: Optional[tuple] = None):
+
+    """Build the main graph. With async_mode=True, all LLM and search nodes are native coroutines, so the graph should be run with ainvoke/astream.
+    Pass a search_cache (e.g. InMemorySearchCache or SQLiteSearchCache) to reuse web/Wikipedia results across consultations and runs,
+    and an llm_cache (e.g. LLMResponseCache) to replay identical temperature-0 LLM calls without a network round trip.
+    All chat models are shared clients from model_registry (defaults to the process-wide registry), chosen per node by model_routes
+    (ModelRoutes, e.g. ModelRoutes({"query_constructor": "gpt-4.1-mini-2025-04-14"}); defaults to DEFAULT_MODEL_ROUTES).
+    With incremental_assembly=True, sections are pre-processed inside each consultation branch and the final node only stitches them together.
+    Pass a metrics registry to record per-node latency, queue wait, token and search payload metrics for every run,
+    and a prefetcher (SearchPrefetcher) to speculatively run the consultation searches for predicted queries.
+    alternative_queries sets how many fallback web queries the consultation query planner proposes.
+    Pass a checkpointer (e.g. SQLiteCheckpointer) to persist threads durably; defaults to an in-memory MemorySaver.
+    The planning loop stops once successive drafts change less than convergence_threshold (None disables the check).
+    prompt_budgets (PromptBudgets) sets the per-node token budgets the consultation prompts are trimmed to.
+    Pass a retrieval_index (RetrievalIndex) to reuse relevant documents fetched by earlier consultations instead of searching live.
+    Concurrent near-identical searches of the parallel consultations are merged by search_coalescer (defaults to the process-wide SearchCoalescer).
+    A resilience policy (ResiliencePolicy) adds deadlines, retries and hedged requests to the searches; pass it to ModelRegistry(resilience=...) for the LLM calls.
+    search_clients (web search class, Wikipedia loader class) replace TavilySearch and WikipediaLoader, e.g. with the benchmark stand-ins."""
+
+    # Get the shared chat models of the nodes
+    model_routes = model_routes or ModelRoutes()
+    plan_writer_llm = model_routes.chat_model("plan_writer", model_registry, llm_cache)
 
     # Dynamic parallelisation logic (mapping step of the Map-Reduce workflow)
     def map_to_consultation(state: PlanningOutputState):
@@ -58,11 +88,10 @@ def build_main_graph():
     5. There should be only one Summary section in the finished plan with a brief outline of all the steps.
     6. Use markdown formatting. 
     7. Start the plan with a single title header: `# Personalised Wellbeing Action Plan`
-    8. Preserve any citations in the sections, which will be annotated in brackets, for example [1] or [2]
-    9. Create a final, consolidated list of sources and add to a Sources section with the `## Sources` header.
-    10. List your sources in order and do not repeat.
-    11. Include no pre-amble for the plan. Only output the finished plan.
-    12. If you format some steps as a numbered list, be consistent and do the same for other sections (if appropriate).
+    8. Preserve all citations in the sections exactly as they are, for example [1] or [2]. They are already numbered consistently across all sections.
+    9. Do not add a Sources section. The consolidated list of sources will be appended to the plan automatically.
+    10. Include no pre-amble for the plan. Only output the finished plan.
+    11. If you format some steps as a numbered list, be consistent and do the same for other sections (if appropriate).
 
     12. Expected structure of the plan:
 
@@ -78,29 +107,35 @@ def build_main_graph():
 
     ...
 
-    ### Sources
+    """ 
 
-    [1] Source 1
-    [2] Source 2 
-    ...
+    def merged_sections(state: OverallState):
 
-    """ 
+        """Merge the citations of the pre-written sections deterministically: plan-wide numbering and sources deduplicated by canonical URL."""
 
-    # Final node
-    def plan_writer(state: OverallState):
-        
-        """Node writing the final version of the wellbeing action plan."""
-        
-        # Print progress message
-        log("[Finalising] Writing final version of personalised wellbeing action plan...")
+        section_parts = [parse_section(section) for section in state["sections"]]
+        unparsed = missing_sources(section_parts)
+        if unparsed:
+            log(f"[Finalising] No Sources list found in sections {unparsed}, keeping their citations unchanged")
+        bodies, sources = merge_sources(section_parts)
+
+        # Format all pre-written sections without their individual Sources lists
+        all_sections = "\n\n---\n\n".join(
+            [f"## {part['title']}\n\n{body}" for part, body in zip(section_parts, bodies)]
+        )
+
+        return all_sections, sources
+
+    def plan_writer_messages(state: OverallState, all_sections: str):
+
+        """Format the messages for the plan_writer node."""
 
         problem = state["problem"]
-        sections = state["sections"]
 
         # Format the instructions
         formatted_plan_instructions = plan_writer_instructions.format(
             problem=problem,
-            all_sections="\n\n---\n\n".join([section for section in sections]) # Format all pre-written sections
+            all_sections=all_sections
         )
 
         messages = [
@@ -108,27 +143,112 @@ def build_main_graph():
             AIMessage(content="Write a finished version of the Wellbeing Action Plan")
         ]
 
-        # Generate the final plan
-        final_plan = llm_5_mini.invoke(messages)
+        return messages
+
+    def plan_writer_update(final_plan, sources):
+
+        """Log the progress and return the final plan with the consolidated list of sources appended."""
 
         # Print progress message
         if final_plan.content:
             log("[Completed] Plan successfully generated!")
+            return {"final_plan": f"{strip_sources(final_plan.content)}\n\n{sources_section(sources)}"}
 
         return {"final_plan": final_plan.content}
 
+    # Final node
+    def plan_writer(state: OverallState):
+        
+        """Node writing the final version of the wellbeing action plan."""
+        
+        # Print progress message
+        log("[Finalising] Writing final version of personalised wellbeing action plan...")
+
+        all_sections, sources = merged_sections(state)
+
+        # Generate the final plan
+        final_plan = plan_writer_llm.invoke(plan_writer_messages(state, all_sections))
+
+        return plan_writer_update(final_plan, sources)
+
+    async def aplan_writer(state: OverallState):
+
+        """Async variant of the plan_writer node."""
+
+        log("[Finalising] Writing final version of personalised wellbeing action plan...")
+
+        all_sections, sources = merged_sections(state)
+
+        final_plan = await plan_writer_llm.ainvoke(plan_writer_messages(state, all_sections))
+
+        return plan_writer_update(final_plan, sources)
+
+    def stitched_plan(state: OverallState):
+
+        """Stitch the sections pre-processed by the consultation branches, or return None if they overlap."""
+
+        section_parts = state.get("section_parts", [])
+        duplicates = find_duplicate_sections(section_parts)
+
+        if duplicates:
+            log(f"[Finalising] Overlapping sections {duplicates}, consolidating them with the LLM...")
+            return None
+
+        unparsed = missing_sources(section_parts)
+        if unparsed:
+            log(f"[Finalising] No Sources list found in sections {unparsed}, consolidating them with the LLM...")
+            return None
+
+        return stitch_plan(section_parts)
+
+    def plan_assembler(state: OverallState):
+
+        """Node assembling the final plan from pre-processed sections (incremental assembly), with the LLM as a fallback."""
+
+        log("[Finalising] Assembling final version of personalised wellbeing action plan...")
+
+        final_plan = stitched_plan(state)
+
+        # Fall back to the LLM consolidation if the sections duplicate one another
+        if final_plan is None:
+            all_sections, sources = merged_sections(state)
+            return plan_writer_update(plan_writer_llm.invoke(plan_writer_messages(state, all_sections)), sources)
+
+        log("[Completed] Plan successfully generated!")
+
+        return {"final_plan": final_plan}
+
+    async def aplan_assembler(state: OverallState):
+
+        """Async variant of the plan_assembler node."""
+
+        log("[Finalising] Assembling final version of personalised wellbeing action plan...")
+
+        final_plan = stitched_plan(state)
+
+        if final_plan is None:
+            all_sections, sources = merged_sections(state)
+            return plan_writer_update(await plan_writer_llm.ainvoke(plan_writer_messages(state, all_sections)), sources)
+
+        log("[Completed] Plan successfully generated!")
+
+        return {"final_plan": final_plan}
+
 
     # Build the parent graph
     builder = StateGraph(OverallState)
     
     # Create subgraphs
-    planner_subgraph = build_planner_subgraph()
-    consultation_subgraph = build_consultation_subgraph()
+    planner_subgraph = build_planner_subgraph(async_mode=async_mode, llm_cache=llm_cache, model_registry=model_registry, convergence_threshold=convergence_threshold, metrics=metrics, model_routes=model_routes)
+    consultation_subgraph = build_consultation_subgraph(async_mode=async_mode, search_cache=search_cache, llm_cache=llm_cache, model_registry=model_registry, incremental_assembly=incremental_assembly, prefetcher=prefetcher, alternative_queries=alternative_queries, prompt_budgets=prompt_budgets, retrieval_index=retrieval_index, search_coalescer=search_coalescer, resilience=resilience, model_routes=model_routes, search_clients=search_clients)
     
     # Add nodes (subgraphs)
     builder.add_node("advice_planning_subgraph", planner_subgraph)
     builder.add_node("consultation_subgraph", consultation_subgraph)
-    builder.add_node("plan_writer", plan_writer)
+    if incremental_assembly:
+        builder.add_node("plan_writer", aplan_assembler if async_mode else plan_assembler)
+    else:
+        builder.add_node("plan_writer", aplan_writer if async_mode else plan_writer)
 
     # Add logic
     builder.add_edge(START, "advice_planning_subgraph")
@@ -136,10 +256,25 @@ def build_main_graph():
     builder.add_edge("consultation_subgraph", "plan_writer")
     builder.add_edge("plan_writer", END)
 
-    # Include memory
-    memory = MemorySaver()
+    # Include memory (in-process unless a durable checkpointer is passed)
+    memory = checkpointer if checkpointer is not None else MemorySaver()
     
-    # Compile and return the main graph
-    return builder.compile(checkpointer=memory)
+    # Compile the main graph
+    graph = builder.compile(checkpointer=memory)
+
+    # Instrument every node (including subgraph nodes) through callbacks
+    if metrics is not None:
+        graph = graph.with_config(callbacks=[MetricsCallbackHandler(metrics)])
+
+    return graph
+
+
+@lru_cache(maxsize=16)
+def get_main_graph(**options):
+
+    """Return the compiled main graph for these build_main_graph options, building it only on the first call.
 
+    Callers passing the same options (the caches, registries and checkpointer are compared by identity)
+    share one compiled graph and its checkpointer, so separate thread_ids must be used per run."""
 
+    return build_main_graph(**options)
@@ -1,4 +1,4 @@
-from typing import Annotated, List
+from typing import List
 from pydantic import BaseModel, Field
 
 # Schema for the Advice Planning subgraph
@@ -21,4 +21,10 @@ class Steps(BaseModel):#
 
     # Schema for the search query formatting
 class SearchQuery(BaseModel):
-    search_query: str = Field(None, description="Search query for retrieval.")
\ No newline at end of file
+    search_query: str = Field(None, description="Search query for retrieval.")
+
+    # Schema for the combined web and Wikipedia query planning
+class SearchQueries(BaseModel):
+    web_query: str = Field(None, description="Well-structured web search query.")
+    wiki_query: str = Field(None, description="Short Wikipedia search query using specific, unique terms.")
+    alternative_web_queries: List[str] = Field(default_factory=list, description="Alternative web search queries, used if the main query returns no results.")
@@ -1,4 +1,5 @@
 from src.schemas.models import Step
+from src.utils.source_docs import merge_source_docs
 from langgraph.graph import MessagesState
 from typing_extensions import TypedDict
 from typing import Annotated, List
@@ -10,6 +11,7 @@ class AdvicePlanningState(MessagesState):
     max_steps: int # maximum number of steps in the wellbing action plan
     max_cycles : int # maximum number of allowed |ai_feedback| -> |advice_planner| cycles
     plan: str # a wellbeing action plan that has been approved by the user
+    plan_change: float # fraction of the plan changed by the latest revision (None for a first draft)
     steps: List[Step] # a list of selected steps in the wellbeing action plan
     cycles_counter : int # for tracking the cycles
     user_feedback : bool # if user provided a feedback to work on
@@ -27,14 +29,17 @@ class ConsultationState(MessagesState):
     step: Step # an individual step from the plan received through Send() API
     webquery: str # a query constructed for the web search
     wikiquery: str # a query constructed for the Wikipedia search
-    transcript: str # transcript from the consultation
+    webquery_alternatives: list # alternative web search queries from the query planner
+    transcript: Annotated[list, operator.add] # append-only transcript of the consultation (speaker, text, message id records)
     summary: str # summary of the consultation (for exceptionally long lists of messages)
     cycles_counter : int # |question| -> |answer| cycles counter 
-    source_docs: Annotated[list, operator.add] # docs with the context the practitioner is using to provide answers
+    source_docs: Annotated[list, merge_source_docs] # bounded store of docs with the context the practitioner is using to provide answers
     sections: list # Written section aggregated in the OverallState through Send() API
+    section_parts: list # Pre-processed section (title, body, sources, summary) for incremental plan assembly
 
 class ConsultationOutputState(TypedDict):
     sections: list # Written section aggregated in the OverallState through Send() API  
+    section_parts: list # Pre-processed section aggregated in the OverallState through Send() API
 
 # Parent graph state
 class OverallState(TypedDict):
@@ -42,4 +47,5 @@ class OverallState(TypedDict):
     max_steps: int # maximum number of steps in the wellbing action plan
     max_cycles: int # depth of research across both subgraphs (advice planner and consultation) 
     sections: Annotated[list, operator.add] # Send() API key where all written sections are aggregated
+    section_parts: Annotated[list, operator.add] # Send() API key where pre-processed sections are aggregated (incremental assembly)
     final_plan: str # Final version of the plan including all individual sections
\ No newline at end of file
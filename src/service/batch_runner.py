@@ -0,0 +1,129 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Iterable, List
+
+from langgraph.types import Command
+
+from src.utils.logging_utils import log
+
+
+APPROVAL = "No feedback"
+
+
+def read_problems(path: str) -> List[dict]:
+    """Read the batch input: one JSON object per line with a "problem" and optional "id", "max_steps",
+    "max_cycles" and "feedback" (scripted answers to the human_feedback interrupts)."""
+
+    problems = []
+    with open(path) as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            problem = json.loads(line)
+            problem.setdefault("id", str(line_number))
+            problems.append(problem)
+    return problems
+
+
+def answered_feedback(snapshot) -> int:
+    """Number of scripted answers a checkpointed thread already consumed at human_feedback.
+
+    Every answer but the approval adds a user message to the conversation of the advice planning
+    subgraph, whose state is included in the snapshot when it is read with subgraphs=True.
+    """
+
+    for task in snapshot.tasks:
+        if task.name == "advice_planning_subgraph":
+            messages = getattr(task.state, "values", {}).get("messages", [])
+            return sum(1 for message in messages if message.type == "human" and message.name == "user")
+    return 0
+
+
+def completed_ids(path: str) -> set:
+    """Ids of the problems already done in the output file, so an interrupted batch can be resumed (failed problems are retried)."""
+
+    if not Path(path).exists():
+        return set()
+    with open(path) as file:
+        results = [json.loads(line) for line in file if line.strip()]
+    return {result["id"] for result in results if result.get("status") == "done"}
+
+
+class BatchRunner:
+    """Runs many problems through a compiled async graph with a bounded pool of workers.
+
+    Every problem gets its own thread (batch-<id>), so with a durable checkpointer a crashed batch
+    also resumes the problems that were in flight. The plan is approved at human_feedback, after
+    any scripted feedback of the problem has been applied.
+    """
+
+    def __init__(self, graph, workers: int = 8, max_steps: int = 3):
+        self.graph = graph
+        self.workers = workers
+        self.max_steps = max_steps
+
+    async def run_problem(self, problem: dict) -> dict:
+        config = {"configurable": {"thread_id": f"batch-{problem['id']}"}}
+        feedback = list(problem.get("feedback", []))
+        started = time.perf_counter()
+
+        # Continue a thread left unfinished by a previous batch run (or reuse its plan if it finished before being written out)
+        snapshot = await self.graph.aget_state(config, subgraphs=True)
+        if snapshot.next:
+            # Answers given before the interruption are not sent again
+            del feedback[:answered_feedback(snapshot)]
+            # A thread waiting at human_feedback gets the next answer (resuming it with None would replay the previous one)
+            graph_input = Command(resume=feedback.pop(0) if feedback else APPROVAL) if snapshot.interrupts else None
+        elif snapshot.values.get("final_plan"):
+            return {"id": problem["id"], "status": "done", "problem": problem["problem"], "final_plan": snapshot.values["final_plan"], "elapsed_s": 0.0}
+        else:
+            graph_input = {"problem": problem["problem"], "max_steps": problem.get("max_steps", self.max_steps)}
+            if "max_cycles" in problem:
+                graph_input["max_cycles"] = problem["max_cycles"]
+
+        try:
+            while True:
+                result = await self.graph.ainvoke(graph_input, config=config)
+                if not result.get("__interrupt__"):
+                    break
+                graph_input = Command(resume=feedback.pop(0) if feedback else APPROVAL)
+        except Exception as error:
+            return {"id": problem["id"], "status": "error", "error": f"{type(error).__name__}: {error}"}
+
+        return {
+            "id": problem["id"],
+            "status": "done",
+            "problem": problem["problem"],
+            "final_plan": result.get("final_plan", ""),
+            "elapsed_s": round(time.perf_counter() - started, 3),
+        }
+
+    async def run(self, problems: Iterable[dict], output_path: str) -> dict:
+        """Run the problems not yet in output_path, appending one JSON result per line as they finish."""
+
+        done = completed_ids(output_path)
+        queue = asyncio.Queue()
+        for problem in problems:
+            if problem["id"] not in done:
+                queue.put_nowait(problem)
+
+        counts = {"skipped": len(done), "done": 0, "error": 0}
+        total = queue.qsize()
+
+        with open(output_path, "a") as output:
+
+            async def worker():
+                while not queue.empty():
+                    problem = queue.get_nowait()
+                    result = await self.run_problem(problem)
+                    # Single-threaded event loop: whole lines are written and flushed one at a time
+                    output.write(json.dumps(result) + "\n")
+                    output.flush()
+                    counts[result["status"]] += 1
+                    log(f"[Batch] {counts['done'] + counts['error']}/{total} problems processed ({result['id']}: {result['status']})")
+
+            await asyncio.gather(*(worker() for _ in range(min(self.workers, total) or 1)))
+
+        return counts
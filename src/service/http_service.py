@@ -0,0 +1,268 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Dict, Optional
+
+from aiohttp import web
+from langgraph.types import Command
+
+from src.utils.metrics import MetricsRegistry
+
+
+# Tenant of every request when the service runs without API keys
+DEFAULT_TENANT = "default"
+
+
+class ThreadRun:
+    """Status of one graph thread served by the service (owned by a single tenant)."""
+
+    def __init__(self, thread_id: str, tenant: str):
+        self.thread_id = thread_id
+        self.tenant = tenant
+        self.status = "queued" # queued | running | interrupted | done | error
+        self.interrupt = None # value passed to interrupt() by human_feedback
+        self.final_plan = None
+        self.error = None
+        self.updated_at = time.time()
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers = set() # asyncio.Queue per connected event stream
+
+    def to_json(self) -> dict:
+        return {
+            "thread_id": self.thread_id,
+            "status": self.status,
+            "interrupt": self.interrupt,
+            "final_plan": self.final_plan,
+            "error": self.error,
+        }
+
+
+class GraphService:
+    """Serves many concurrent threads of one compiled (async) graph.
+
+    Runs start and resume in the background and stop at every human_feedback interrupt, which is
+    answered through the resume endpoint (Command(resume=...)). Runs are limited to
+    max_concurrent_runs overall and per_tenant_runs per tenant; excess runs wait in the queued state.
+    Finished threads are forgotten run_ttl seconds after their last update; threads waiting for
+    feedback are kept until they are resumed, however long the review takes.
+
+    Requests authenticate with a bearer token mapped to its tenant by api_keys; unknown tokens are
+    rejected and threads are only visible to their tenant. Without api_keys every request belongs to
+    a single default tenant. Threads unknown to the process (e.g. after a restart) are rebuilt from
+    the graph's checkpoints, which record their tenant.
+    """
+
+    def __init__(
+        self,
+        graph,
+        max_concurrent_runs: int = 32,
+        per_tenant_runs: int = 4,
+        run_ttl: float = 60 * 60,
+        metrics: Optional[MetricsRegistry] = None,
+        api_keys: Optional[Dict[str, str]] = None,
+    ):
+        self.graph = graph
+        self.metrics = metrics
+        self.per_tenant_runs = per_tenant_runs
+        self.run_ttl = run_ttl
+        self.api_keys = api_keys # bearer token -> tenant
+        self.runs = {} # thread_id -> ThreadRun
+        self._global_slots = asyncio.Semaphore(max_concurrent_runs)
+        # One semaphore per configured tenant, so the set cannot grow with the requests
+        tenants = set(api_keys.values()) if api_keys else {DEFAULT_TENANT}
+        self._tenant_slots = {tenant: asyncio.Semaphore(per_tenant_runs) for tenant in tenants}
+
+    # Runs
+
+    def _publish(self, run: ThreadRun, event: dict):
+        for queue in run.subscribers:
+            queue.put_nowait(event)
+
+    def _set_status(self, run: ThreadRun, status: str, **fields):
+        run.status = status
+        run.updated_at = time.time()
+        for name, value in fields.items():
+            setattr(run, name, value)
+        self._publish(run, {"type": "status", **run.to_json()})
+
+    async def _run(self, run: ThreadRun, graph_input):
+        # The tenant is stored in the checkpoint metadata, to rebuild the run after a restart
+        config = {"configurable": {"thread_id": run.thread_id}, "metadata": {"tenant": run.tenant}}
+
+        async with self._tenant_slots[run.tenant], self._global_slots:
+            self._set_status(run, "running", interrupt=None)
+            interrupt = None
+            try:
+                async for mode, chunk in self.graph.astream(graph_input, config=config, stream_mode=["messages", "updates"]):
+                    if mode == "messages":
+                        message, metadata = chunk
+                        if message.text:
+                            self._publish(run, {"type": "token", "node": metadata.get("langgraph_node"), "text": message.text})
+                    elif "__interrupt__" in chunk:
+                        interrupt = chunk["__interrupt__"][0].value
+                    else:
+                        self._publish(run, {"type": "update", "nodes": list(chunk)})
+                        if (chunk.get("plan_writer") or {}).get("final_plan"):
+                            run.final_plan = chunk["plan_writer"]["final_plan"]
+            except Exception as error:
+                self._set_status(run, "error", error=f"{type(error).__name__}: {error}")
+                return
+
+        if interrupt is not None:
+            self._set_status(run, "interrupted", interrupt=interrupt)
+        else:
+            self._set_status(run, "done")
+
+    def _forget_stale_runs(self):
+        expired = time.time() - self.run_ttl
+        for thread_id, run in list(self.runs.items()):
+            if run.status in ("done", "error") and run.updated_at < expired:
+                del self.runs[thread_id]
+
+    def start(self, tenant: str, graph_input: dict) -> ThreadRun:
+        self._forget_stale_runs()
+        run = ThreadRun(str(uuid.uuid4()), tenant)
+        self.runs[run.thread_id] = run
+        run.task = asyncio.create_task(self._run(run, graph_input))
+        return run
+
+    def resume(self, run: ThreadRun, feedback: str):
+        # Called without an await since the status check, so concurrent resumes cannot both start a run
+        if run.status != "interrupted":
+            raise web.HTTPConflict(text=json.dumps({"error": f"thread is {run.status}, not waiting for feedback"}), content_type="application/json")
+        self._set_status(run, "queued")
+        run.task = asyncio.create_task(self._run(run, Command(resume=feedback)))
+
+    async def _restore(self, thread_id: str) -> Optional[ThreadRun]:
+        """Rebuild the run of a thread from its latest checkpoint (None if the graph has none)."""
+
+        try:
+            snapshot = await self.graph.aget_state({"configurable": {"thread_id": thread_id}})
+        except ValueError: # compiled without a checkpointer
+            return None
+        if snapshot.created_at is None or "tenant" not in snapshot.metadata:
+            return None
+
+        run = ThreadRun(thread_id, snapshot.metadata["tenant"])
+        if snapshot.interrupts:
+            run.status, run.interrupt = "interrupted", snapshot.interrupts[0].value
+        elif not snapshot.next:
+            run.status, run.final_plan = "done", snapshot.values.get("final_plan")
+        else:
+            run.status, run.error = "error", "the run stopped before finishing (service restart)"
+
+        # Another request may have restored it meanwhile
+        return self.runs.setdefault(thread_id, run)
+
+    async def get(self, tenant: str, thread_id: str) -> ThreadRun:
+        run = self.runs.get(thread_id)
+        if run is None:
+            run = await self._restore(thread_id)
+        # Threads of other tenants are reported as missing
+        if run is None or run.tenant != tenant:
+            raise web.HTTPNotFound(text=json.dumps({"error": "unknown thread"}), content_type="application/json")
+        return run
+
+    async def close(self):
+        tasks = [run.task for run in self.runs.values() if run.task is not None and not run.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # HTTP handlers
+
+    def _tenant(self, request: web.Request) -> str:
+        """Tenant of the request's bearer token."""
+
+        if not self.api_keys:
+            return DEFAULT_TENANT
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        tenant = self.api_keys.get(token.strip()) if scheme.lower() == "bearer" else None
+        if tenant is None:
+            raise web.HTTPUnauthorized(
+                text=json.dumps({"error": "missing or unknown API key"}),
+                content_type="application/json",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return tenant
+
+    @staticmethod
+    async def _json_body(request: web.Request) -> dict:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "invalid JSON body"}), content_type="application/json")
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text=json.dumps({"error": "the body must be a JSON object"}), content_type="application/json")
+        return body
+
+    async def handle_start(self, request: web.Request):
+        body = await self._json_body(request)
+        if not body.get("problem"):
+            raise web.HTTPBadRequest(text=json.dumps({"error": "problem is required"}), content_type="application/json")
+
+        graph_input = {"problem": body["problem"], "max_steps": body.get("max_steps", 3)}
+        if "max_cycles" in body:
+            graph_input["max_cycles"] = body["max_cycles"]
+
+        run = self.start(self._tenant(request), graph_input)
+        return web.json_response(run.to_json(), status=202)
+
+    async def handle_resume(self, request: web.Request):
+        run = await self.get(self._tenant(request), request.match_info["thread_id"])
+        # The body is read first: resume() checks and sets the status with no await in between
+        body = await self._json_body(request)
+        self.resume(run, body.get("feedback", "No feedback"))
+        return web.json_response(run.to_json(), status=202)
+
+    async def handle_status(self, request: web.Request):
+        run = await self.get(self._tenant(request), request.match_info["thread_id"])
+        return web.json_response(run.to_json())
+
+    async def handle_events(self, request: web.Request):
+        """Server-sent events of a thread: status changes, node updates and LLM tokens, until the run stops."""
+
+        run = await self.get(self._tenant(request), request.match_info["thread_id"])
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        queue = asyncio.Queue()
+        run.subscribers.add(queue)
+        try:
+            event = {"type": "status", **run.to_json()}
+            while True:
+                await response.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                if event["type"] == "status" and event["status"] in ("interrupted", "done", "error"):
+                    break
+                event = await queue.get()
+        finally:
+            run.subscribers.discard(queue)
+
+        return response
+
+    async def handle_metrics(self, request: web.Request):
+        if self.metrics is None:
+            raise web.HTTPNotFound()
+        return web.Response(text=self.metrics.to_prometheus(), content_type="text/plain")
+
+
+def create_app(graph, **service_kwargs) -> web.Application:
+    """Create the aiohttp application serving a compiled graph (built with async_mode=True)."""
+
+    service = GraphService(graph, **service_kwargs)
+    app = web.Application()
+    app["service"] = service
+    app.add_routes([
+        web.post("/threads", service.handle_start),
+        web.get("/threads/{thread_id}", service.handle_status),
+        web.post("/threads/{thread_id}/resume", service.handle_resume),
+        web.get("/threads/{thread_id}/events", service.handle_events),
+        web.get("/metrics", service.handle_metrics),
+    ])
+
+    async def close_service(app):
+        await service.close()
+
+    app.on_cleanup.append(close_service)
+    return app
@@ -0,0 +1,448 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.base import SerializerProtocol
+
+
+# Channel versions without a stored value (e.g. deleted or empty channels)
+MISSING = object()
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver[str]):
+    """Durable checkpointer storing graph state in a SQLite file, so interrupted runs can be resumed after a restart.
+
+    A checkpoint only stores its channel versions, while channel values live in a blobs table written
+    only for the channels that changed in that step. Lists that grew by appending (the transcript,
+    sections, ...) are delta-encoded: the blob holds only the appended items and the version of the
+    blob it extends, up to max_delta_chain deltas in a row before a full value is written again.
+    Serialised values above compress_threshold bytes are zlib-compressed.
+
+    Retention: every gc_every checkpoints (or on an explicit gc() call), threads inactive for longer
+    than max_thread_age seconds are deleted and only the latest max_checkpoints_per_thread checkpoints
+    of every thread namespace are kept, together with the blobs and writes they still reference
+    (deltas whose base is deleted are rebased into full values first).
+    """
+
+    def __init__(
+        self,
+        path: str = ".cache/checkpoints.sqlite",
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        compress_threshold: int = 1024,
+        max_checkpoints_per_thread: Optional[int] = 20,
+        max_thread_age: Optional[float] = 7 * 24 * 60 * 60,
+        gc_every: int = 200,
+        max_delta_chain: int = 32,
+        max_tracked_lists: int = 1024,
+    ):
+        super().__init__(serde=serde)
+        self.compress_threshold = compress_threshold
+        self.max_delta_chain = max_delta_chain # 0 writes every value whole
+        self.max_tracked_lists = max_tracked_lists
+        # (thread_id, checkpoint_ns, channel) -> (version, list value, deltas since the full value) of the latest list blobs
+        self._lists = OrderedDict()
+        self.max_checkpoints_per_thread = max_checkpoints_per_thread
+        self.max_thread_age = max_thread_age
+        self.gc_every = gc_every
+        self._puts_since_gc = 0
+        self._lock = threading.RLock()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL, parent_checkpoint_id TEXT, "
+            "type TEXT, checkpoint BLOB, compressed INTEGER NOT NULL, metadata BLOB, channel_versions TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id));"
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL, version TEXT NOT NULL, "
+            "type TEXT NOT NULL, value BLOB, compressed INTEGER NOT NULL, base TEXT, "
+            "PRIMARY KEY (thread_id, checkpoint_ns, channel, version));"
+            "CREATE TABLE IF NOT EXISTS writes ("
+            "thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL, task_id TEXT NOT NULL, idx INTEGER NOT NULL, "
+            "channel TEXT NOT NULL, type TEXT, value BLOB, compressed INTEGER NOT NULL, task_path TEXT NOT NULL DEFAULT '', "
+            "PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx));"
+            "CREATE INDEX IF NOT EXISTS checkpoints_created ON checkpoints (thread_id, created_at);"
+        )
+        # Files written before delta encoding
+        if "base" not in [column[1] for column in self._conn.execute("PRAGMA table_info(blobs)")]:
+            self._conn.execute("ALTER TABLE blobs ADD COLUMN base TEXT")
+        self._conn.commit()
+
+    # Serialisation
+
+    def _dumps(self, value: Any):
+        type_, data = self.serde.dumps_typed(value)
+        if len(data) > self.compress_threshold:
+            return type_, zlib.compress(data), 1
+        return type_, data, 0
+
+    def _loads(self, type_: str, data: bytes, compressed: int) -> Any:
+        return self.serde.loads_typed((type_, zlib.decompress(data) if compressed else data))
+
+    # Reads
+
+    def _load_blob(self, thread_id: str, checkpoint_ns: str, channel: str, version: str):
+        """Value of a channel version, following the chain of deltas back to a full value (MISSING if missing or empty)."""
+
+        suffixes = []
+        while True:
+            row = self._conn.execute(
+                "SELECT type, value, compressed, base FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, version),
+            ).fetchone()
+            if row is None or row[0] == "empty":
+                return MISSING
+            if row[3] is None:
+                break
+            suffixes.append(self._loads(*row[:3]))
+            version = row[3]
+
+        value = self._loads(*row[:3])
+        for suffix in reversed(suffixes):
+            value = value + suffix
+        return value
+
+    def _load_blobs(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> dict:
+        values = {}
+        for channel, version in versions.items():
+            value = self._load_blob(thread_id, checkpoint_ns, channel, str(version))
+            if value is not MISSING:
+                values[channel] = value
+        return values
+
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> list:
+        rows = self._conn.execute(
+            "SELECT task_id, channel, type, value, compressed FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return [(task_id, channel, self._loads(type_, value, compressed)) for task_id, channel, type_, value, compressed in rows]
+
+    def _tuple(self, row) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, data, compressed, metadata = row
+        checkpoint = self._loads(type_, data, compressed)
+
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={**checkpoint, "channel_values": self._load_blobs(thread_id, checkpoint_ns, checkpoint["channel_versions"])},
+            metadata=json.loads(metadata),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id}}
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=self._load_writes(thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    _COLUMNS = "thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, compressed, metadata"
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f"SELECT {self._COLUMNS} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {self._COLUMNS} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._tuple(row) if row is not None else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query, params = f"SELECT {self._COLUMNS} FROM checkpoints WHERE 1 = 1", []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            metadata = json.loads(row[7])
+            if filter and not all(metadata.get(key) == value for key, value in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            with self._lock:
+                checkpoint_tuple = self._tuple(row)
+            yield checkpoint_tuple
+
+    # Writes
+
+    def _blob(self, thread_id: str, checkpoint_ns: str, channel: str, version: str, values: dict) -> tuple:
+        """Row of the blobs table for a channel version: a delta if the value extends the latest list written for the channel."""
+
+        if channel not in values:
+            return (thread_id, checkpoint_ns, channel, version, "empty", None, 0, None)
+
+        value = values[channel]
+        key = (thread_id, checkpoint_ns, channel)
+        previous = self._lists.pop(key, None)
+        if not isinstance(value, list):
+            return (thread_id, checkpoint_ns, channel, version, *self._dumps(value), None)
+
+        # Lists only grow through the reducers by building new lists, so the previous one is still intact
+        if (
+            previous is not None
+            and previous[2] < self.max_delta_chain
+            and len(value) > len(previous[1])
+            and value[:len(previous[1])] == previous[1]
+        ):
+            row = (thread_id, checkpoint_ns, channel, version, *self._dumps(value[len(previous[1]):]), previous[0])
+            depth = previous[2] + 1
+        else:
+            row = (thread_id, checkpoint_ns, channel, version, *self._dumps(value), None)
+            depth = 0
+
+        self._lists[key] = (version, value, depth)
+        if len(self._lists) > self.max_tracked_lists:
+            self._lists.popitem(last=False)
+        return row
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        checkpoint = checkpoint.copy()
+        values = checkpoint.pop("channel_values")
+
+        metadata = json.dumps(get_checkpoint_metadata(config, metadata), default=str)
+
+        with self._lock:
+            # Only the channels updated in this step are written, appended lists as deltas
+            blobs = [self._blob(thread_id, checkpoint_ns, channel, str(version), values) for channel, version in new_versions.items()]
+            self._conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", blobs)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                    *self._dumps(checkpoint), metadata,
+                    json.dumps([[channel, str(version)] for channel, version in checkpoint["channel_versions"].items()]),
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+
+            self._puts_since_gc += 1
+            if self.gc_every and self._puts_since_gc >= self.gc_every:
+                self.gc()
+
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple], task_id: str, task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        rows = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel, *self._dumps(value), task_path)
+            for idx, (channel, value) in enumerate(writes)
+        ]
+
+        with self._lock:
+            # Special writes (errors, interrupts, ...) replace earlier ones, regular writes are only stored once
+            self._conn.executemany("INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [row for row in rows if row[4] >= 0])
+            self._conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [row for row in rows if row[4] < 0])
+            self._conn.commit()
+
+    def get_next_version(self, current: Optional[str], channel: None = None) -> str:
+        # Same version format as MemorySaver: zero-padded counter plus a random tie-breaker
+        if current is None:
+            current_version = 0
+        elif isinstance(current, int):
+            current_version = current
+        else:
+            current_version = int(current.split(".")[0])
+        return f"{current_version + 1:032}.{random.random():016}"
+
+    # Retention
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for table in ("checkpoints", "blobs", "writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            for key in [key for key in self._lists if key[0] == thread_id]:
+                del self._lists[key]
+            self._conn.commit()
+
+    def prune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        """Delete all checkpoints of the threads, or all but the latest checkpoint of each namespace."""
+
+        with self._lock:
+            for thread_id in thread_ids:
+                if strategy == "delete":
+                    self.delete_thread(thread_id)
+                else:
+                    self._keep_latest(thread_id, 1)
+            self._conn.commit()
+
+    def _keep_latest(self, thread_id: str, keep: int):
+        namespaces = self._conn.execute("SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?", (thread_id,)).fetchall()
+
+        for (checkpoint_ns,) in namespaces:
+            stale = self._conn.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                (thread_id, checkpoint_ns, keep),
+            ).fetchall()
+            if not stale:
+                continue
+
+            self._conn.executemany(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                [(thread_id, checkpoint_ns, checkpoint_id) for (checkpoint_id,) in stale],
+            )
+            self._conn.executemany(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                [(thread_id, checkpoint_ns, checkpoint_id) for (checkpoint_id,) in stale],
+            )
+
+            # Drop the channel values no remaining checkpoint refers to
+            referenced = set()
+            for (versions,) in self._conn.execute(
+                "SELECT channel_versions FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?", (thread_id, checkpoint_ns)
+            ):
+                referenced.update((channel, version) for channel, version in json.loads(versions))
+            blobs = self._conn.execute(
+                "SELECT channel, version, base FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?", (thread_id, checkpoint_ns)
+            ).fetchall()
+            stale = {(channel, version) for channel, version, _ in blobs if (channel, version) not in referenced}
+
+            # Rebase the deltas kept on top of deleted blobs into full values (all computed before any is replaced)
+            rebased = [
+                (self._load_blob(thread_id, checkpoint_ns, channel, version), channel, version)
+                for channel, version, base in blobs
+                if (channel, version) not in stale and base is not None and self._chain_hits(thread_id, checkpoint_ns, channel, base, stale)
+            ]
+            self._conn.executemany(
+                "UPDATE blobs SET type = ?, value = ?, compressed = ?, base = NULL "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                [(*self._dumps(value), thread_id, checkpoint_ns, channel, version) for value, channel, version in rebased],
+            )
+            for _, channel, version in rebased:
+                key = (thread_id, checkpoint_ns, channel)
+                if key in self._lists and self._lists[key][0] == version:
+                    self._lists[key] = (*self._lists[key][:2], 0)
+            # Later deltas must not extend a deleted blob
+            for channel, version in stale:
+                key = (thread_id, checkpoint_ns, channel)
+                if key in self._lists and self._lists[key][0] == version:
+                    del self._lists[key]
+
+            self._conn.executemany(
+                "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                [(thread_id, checkpoint_ns, channel, version) for channel, version in stale],
+            )
+
+    def _chain_hits(self, thread_id: str, checkpoint_ns: str, channel: str, version: Optional[str], versions: set) -> bool:
+        """Whether the chain of deltas starting at a version goes through one of the given (channel, version) blobs."""
+
+        while version is not None:
+            if (channel, version) in versions:
+                return True
+            row = self._conn.execute(
+                "SELECT base FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, version),
+            ).fetchone()
+            version = row[0] if row is not None else None
+        return False
+
+    def gc(self):
+        """Apply the retention policy: delete inactive threads and old checkpoints with their unreferenced blobs and writes."""
+
+        with self._lock:
+            self._puts_since_gc = 0
+
+            if self.max_thread_age is not None:
+                expired = self._conn.execute(
+                    "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?",
+                    (time.time() - self.max_thread_age,),
+                ).fetchall()
+                for (thread_id,) in expired:
+                    self.delete_thread(thread_id)
+
+            if self.max_checkpoints_per_thread is not None:
+                crowded = self._conn.execute(
+                    "SELECT DISTINCT thread_id FROM checkpoints GROUP BY thread_id, checkpoint_ns HAVING COUNT(*) > ?",
+                    (self.max_checkpoints_per_thread,),
+                ).fetchall()
+                for (thread_id,) in crowded:
+                    self._keep_latest(thread_id, self.max_checkpoints_per_thread)
+
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("checkpoints", "blobs", "writes")
+            }
+            counts["threads"] = self._conn.execute("SELECT COUNT(DISTINCT thread_id) FROM checkpoints").fetchone()[0]
+        return counts
+
+    def close(self):
+        self._conn.close()
+
+    # Async API: SQLite calls are short and local, so they run inline
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None, before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple], task_id: str, task_path: str = "") -> None:
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return self.delete_thread(thread_id)
+
+    async def aprune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        return self.prune(thread_ids, strategy=strategy)
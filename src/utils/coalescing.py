@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from src.utils.prefetch import query_similarity
+from src.utils.search_cache import normalise_query
+
+
+# Result of a search whose leader was cancelled (or interrupted) before it finished
+ABANDONED = object()
+
+
+class SearchCoalescer:
+    """Single-flight layer merging concurrent searches for the same (or a near-identical) query.
+
+    The first caller of a query runs the search; callers arriving while it is in flight with the
+    same normalised query, or a query at least similarity_threshold similar (Jaccard similarity of
+    the content words), wait for it and share its results (or its exception). If the leader is
+    cancelled instead, its waiters search again themselves (the first becoming the new leader)
+    rather than failing with a cancellation that is not theirs. Nothing is kept once the search
+    completes: repeated searches are the search cache's job.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.75):
+        self.similarity_threshold = similarity_threshold
+        self.searches = 0 # outbound searches
+        self.coalesced = 0 # calls served by another caller's search
+        self._in_flight = {} # (source, normalised query) -> Future
+        self._lock = threading.Lock()
+
+    def _join(self, source: str, query: str) -> Tuple[Tuple[str, str], Future, bool]:
+        """Find the in-flight search serving this query, or register a new one (leader=True)."""
+
+        key = (source, normalise_query(query))
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = next(
+                    (future for (in_flight_source, in_flight_query), future in self._in_flight.items()
+                     if in_flight_source == source and query_similarity(query, in_flight_query) >= self.similarity_threshold),
+                    None,
+                )
+            if future is not None:
+                self.coalesced += 1
+                return key, future, False
+
+            future = Future()
+            future.set_running_or_notify_cancel() # a cancelled waiter must not cancel the search for the others
+            self._in_flight[key] = future
+            self.searches += 1
+            return key, future, True
+
+    def _abandoned(self):
+        """Count a waiter of a cancelled search, which searches again, as not coalesced."""
+
+        with self._lock:
+            self.coalesced -= 1
+
+    def _finish(self, key: Tuple[str, str], future: Future, value: Any = None, error: Optional[Exception] = None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def run(self, source: str, query: str, fetch: Callable[[], Any]):
+        """Return fetch() for the query, sharing the result with concurrent callers of similar queries."""
+
+        while True:
+            key, future, leader = self._join(source, query)
+            if leader:
+                break
+            value = future.result()
+            if value is not ABANDONED:
+                return value
+            self._abandoned()
+
+        try:
+            value = fetch()
+        except Exception as error:
+            self._finish(key, future, error=error)
+            raise
+        except BaseException:
+            self._finish(key, future, ABANDONED)
+            raise
+        self._finish(key, future, value)
+        return value
+
+    async def arun(self, source: str, query: str, afetch: Callable[[], Awaitable[Any]]):
+        """Async variant of run; also merges with searches in flight in other threads or event loops."""
+
+        while True:
+            key, future, leader = self._join(source, query)
+            if leader:
+                break
+            value = await asyncio.wrap_future(future)
+            if value is not ABANDONED:
+                return value
+            self._abandoned()
+
+        try:
+            value = await afetch()
+        except Exception as error:
+            self._finish(key, future, error=error)
+            raise
+        except BaseException:
+            # e.g. the leader's branch was cancelled: the waiters search again
+            self._finish(key, future, ABANDONED)
+            raise
+        self._finish(key, future, value)
+        return value
+
+    def stats(self) -> dict:
+        calls = self.searches + self.coalesced
+        return {"searches": self.searches, "coalesced": self.coalesced, "coalesced_rate": self.coalesced / calls if calls else 0.0}
+
+
+default_coalescer = SearchCoalescer()
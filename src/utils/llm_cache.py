@@ -0,0 +1,130 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation
+
+
+# Classes the cache serialises, used as the deserialisation allowlist
+CACHED_OBJECTS = [ChatGeneration, Generation, AIMessage]
+
+
+def llm_cache_key(prompt: str, llm_string: str) -> str:
+    """Exact-match key for an LLM call.
+
+    LangChain renders the messages into prompt, while llm_string captures the model id,
+    its parameters (e.g. temperature) and bound tools such as a with_structured_output() schema.
+    """
+
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache(BaseCache):
+    """Exact-match LLM response cache with an in-memory LRU tier and an optional SQLite tier.
+
+    Pass it to a chat model (ChatOpenAI(cache=...)) or to build_main_graph(llm_cache=...).
+    Only meant for deterministic (temperature=0) calls, since a hit replays the first response.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_memory_entries: int = 1_000, max_disk_entries: int = 100_000):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict() # key -> serialised generations
+        self._lock = threading.Lock()
+        self._conn = None
+
+        # Optional disk tier, which survives restarts and can be shared by regression runs
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+            self._conn.commit()
+
+    def _remember(self, key: str, value: str):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = llm_cache_key(prompt, llm_string)
+
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+            elif self._conn is not None:
+                row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                    self._conn.commit()
+                    # Promote to the memory tier
+                    self._remember(key, value)
+
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        # Only revive the classes this cache writes (structured outputs come back as plain dicts)
+        return [loads(generation, allowed_objects=CACHED_OBJECTS) for generation in value]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = llm_cache_key(prompt, llm_string)
+        value = [dumps(generation) for generation in return_val]
+
+        with self._lock:
+            self._remember(key, value)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, accessed_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time()),
+                )
+                # Evict the least recently used entries above the size bound
+                (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+                if count > self.max_disk_entries:
+                    self._conn.execute(
+                        "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                        (count - self.max_disk_entries,),
+                    )
+                self._conn.commit()
+
+    def clear(self, **kwargs) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+    # Both tiers are local and fast, so skip the default executor hop in async graphs
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self.lookup(prompt, llm_string)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.update(prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs) -> None:
+        self.clear(**kwargs)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
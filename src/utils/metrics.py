@@ -0,0 +1,230 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+# Default histogram buckets (seconds), from fast local nodes up to slow LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets, as exposed by Prometheus."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    """In-process registry of labelled counters and histograms with Prometheus-text and JSON exporters."""
+
+    def __init__(self):
+        self._counters = defaultdict(lambda: defaultdict(float)) # name -> labels -> value
+        self._histograms = defaultdict(dict) # name -> labels -> Histogram
+        self._help = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels: dict) -> Tuple:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def increment(self, name: str, value: float = 1.0, help: str = "", **labels):
+        with self._lock:
+            self._help.setdefault(name, help)
+            self._counters[name][self._labels(labels)] += value
+
+    def observe(self, name: str, value: float, help: str = "", **labels):
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._histograms[name]
+            key = self._labels(labels)
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_json(self) -> Dict:
+        """Snapshot of all metrics as plain data."""
+
+        with self._lock:
+            return {
+                "counters": {
+                    name: [{"labels": dict(labels), "value": value} for labels, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: [
+                        {"labels": dict(labels), "count": histogram.count, "sum": histogram.sum,
+                         "buckets": {str(bound): count for bound, count in histogram.cumulative()}}
+                        for labels, histogram in series.items()
+                    ]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def to_json_text(self) -> str:
+        return json.dumps(self.to_json(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+
+        def escape(value) -> str:
+            # Label values (e.g. themes written by the LLM) may contain backslashes, quotes and newlines
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for name, series in self._counters.items():
+                lines += [f"# HELP {name} {self._help.get(name, '')}", f"# TYPE {name} counter"]
+                lines += [f"{name}{format_labels(labels)} {value}" for labels, value in series.items()]
+            for name, series in self._histograms.items():
+                lines += [f"# HELP {name} {self._help.get(name, '')}", f"# TYPE {name} histogram"]
+                for labels, histogram in series.items():
+                    for bound, count in histogram.cumulative():
+                        le = "+Inf" if bound == float("inf") else str(bound)
+                        lines.append(f"{name}_bucket{format_labels(labels, [('le', le)])} {count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry used when no registry is passed to build_main_graph
+default_metrics = MetricsRegistry()
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Callback handler recording per-node metrics into a MetricsRegistry.
+
+    For every graph node it records the wall time and the queue wait (time between the previous
+    activity of its graph run and the node actually starting), the prompt/completion tokens of its
+    LLM calls and the bytes of search documents it returns. Metrics are labelled with the node,
+    the thread_id and, inside consultations, the theme of the step.
+    """
+
+    # Record in the calling thread/event loop rather than through the executor, so start/end events stay ordered
+    run_inline = True
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or default_metrics
+        self._nodes = {} # node run id -> (labels, start time)
+        self._labels = {} # run id -> labels of the enclosing node
+        self._last_activity = {} # graph run id -> time of its last node start/end
+        self._lock = threading.Lock()
+
+    def _node_labels(self, node: str, inputs, metadata: dict) -> dict:
+        step = inputs.get("step") if isinstance(inputs, dict) else None
+        return {
+            "node": node,
+            "thread_id": metadata.get("thread_id", ""),
+            "theme": getattr(step, "theme", ""),
+        }
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        node = metadata.get("langgraph_node")
+        now = time.perf_counter()
+
+        with self._lock:
+            # Graph (or subgraph) runs start the clock for their first nodes
+            if node is None or kwargs.get("name") != node:
+                self._last_activity.setdefault(run_id, now)
+                if parent_run_id in self._labels:
+                    self._labels[run_id] = self._labels[parent_run_id]
+                return
+
+            labels = self._node_labels(node, inputs, metadata)
+            self._nodes[run_id] = (labels, now)
+            self._labels[run_id] = labels
+            scheduled = self._last_activity.get(parent_run_id, now)
+            self._last_activity[run_id] = now
+
+        self.registry.observe("node_queue_wait_seconds", now - scheduled, help="Time a node waited to start after its graph run was last active.", **labels)
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        now = time.perf_counter()
+
+        with self._lock:
+            node = self._nodes.pop(run_id, None)
+            self._labels.pop(run_id, None)
+            self._last_activity.pop(run_id, None)
+            if parent_run_id in self._last_activity:
+                self._last_activity[parent_run_id] = now
+
+        if node is None:
+            return
+        labels, started = node
+
+        self.registry.observe("node_latency_seconds", now - started, help="Wall time of a graph node.", **labels)
+
+        # Search documents returned by the websearch/wikisearch nodes
+        if isinstance(outputs, dict) and outputs.get("source_docs"):
+            payload = sum(len(doc.get("content", "").encode("utf-8")) for doc in outputs["source_docs"])
+            self.registry.increment("search_payload_bytes_total", payload, help="Bytes of search documents returned by a node.", **labels)
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            node = self._nodes.get(run_id)
+        # Interrupts surface as errors but are part of the normal human-in-the-loop flow
+        if node is not None and type(error).__name__ != "GraphInterrupt":
+            self.registry.increment("node_errors_total", help="Graph node runs that raised an error.", **node[0])
+        self.on_chain_end(None, run_id=run_id, parent_run_id=parent_run_id)
+
+    def _inherit(self, run_id, parent_run_id):
+        with self._lock:
+            if parent_run_id in self._labels:
+                self._labels[run_id] = self._labels[parent_run_id]
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._inherit(run_id, parent_run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._inherit(run_id, parent_run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            labels = self._labels.pop(run_id, None)
+        if labels is None:
+            return
+
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if not usage:
+                    continue
+                model = (message.response_metadata or {}).get("model_name", "")
+                self.registry.increment("llm_prompt_tokens_total", usage.get("input_tokens", 0), help="Prompt tokens sent by a node.", model=model, **labels)
+                self.registry.increment("llm_completion_tokens_total", usage.get("output_tokens", 0), help="Completion tokens generated for a node.", model=model, **labels)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._labels.pop(run_id, None)
@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import weakref
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+import httpx
+
+from src.utils.rate_limiting import AsyncRateLimitedTransport, RateLimitedTransport, RateLimiter
+from src.utils.resilience import AsyncResilientTransport, ResiliencePolicy, ResilientTransport
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+
+# Per-request timeout of the chat models (seconds)
+REQUEST_TIMEOUT = httpx.Timeout(600.0, pool=None)
+
+
+class LoopLocalTransport(httpx.AsyncBaseTransport):
+    """Async transport keeping one connection pool per event loop.
+
+    Keep-alive connections are bound to the event loop that opened them, so an AsyncClient shared
+    across asyncio.run calls would reuse sockets of a closed loop. The pool of each loop is created
+    on its first request; pools of loops that were closed are dropped (their sockets died with the loop).
+    """
+
+    def __init__(self, factory: Callable[[], httpx.AsyncBaseTransport]):
+        self.factory = factory
+        self._transports = weakref.WeakKeyDictionary() # event loop -> transport
+        self._lock = threading.Lock()
+
+    def _transport(self) -> httpx.AsyncBaseTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                for closed in [other for other in self._transports if other.is_closed()]:
+                    del self._transports[closed]
+                transport = self._transports[loop] = self.factory()
+            return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self):
+        """Close the pool of the running event loop."""
+
+        with self._lock:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+class ModelRegistry:
+    """Hands out shared ChatOpenAI clients instead of one instance per subgraph builder.
+
+    Each model id gets one keep-alive HTTP connection pool (sync and async), shared by every
+    node and parallel consultation branch using that model, so TLS handshakes are amortised.
+    The pool size doubles as the model's concurrency limit: requests above it wait for a free
+    connection instead of opening new sockets. Async pools are kept per event loop, so the
+    registry can serve successive asyncio.run calls.
+
+    An optional RateLimiter is shared by all models of the provider: it is applied at the HTTP
+    transport, so cache hits never count against the quota and 429 responses drive its backoff.
+    An optional ResiliencePolicy adds per-request deadlines, retries and hedging (the SDK's own
+    retries are then disabled unless max_retries is passed); its attempts take their rate limiter
+    slots before their deadline starts.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+        concurrency_limits: Optional[Dict[str, int]] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        resilience: Optional[ResiliencePolicy] = None,
+    ):
+        self.max_connections = max_connections # default per-model concurrency limit
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry # seconds an idle connection is kept open
+        self.concurrency_limits = concurrency_limits or {} # model id -> max in-flight requests
+        self.rate_limiter = rate_limiter # provider-wide requests/min and tokens/min limits
+        self.resilience = resilience # deadlines, retries and hedged requests
+        self._clients = {} # model id -> (httpx.Client, httpx.AsyncClient)
+        self._models = {} # (model id, kwargs) -> ChatOpenAI
+        self._lock = threading.Lock()
+
+    def _limits(self, model: str) -> httpx.Limits:
+        max_connections = self.concurrency_limits.get(model, self.max_connections)
+        return httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=min(self.max_keepalive_connections, max_connections),
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def _http_clients(self, model: str):
+        if model not in self._clients:
+            limits = self._limits(model)
+            transport = httpx.HTTPTransport(limits=limits)
+            async_transport = LoopLocalTransport(lambda: httpx.AsyncHTTPTransport(limits=limits))
+            if self.resilience is not None:
+                # Every attempt (including hedges) takes a rate limiter slot before its deadline starts
+                transport = ResilientTransport(transport, self.resilience, model, rate_limiter=self.rate_limiter)
+                async_transport = AsyncResilientTransport(async_transport, self.resilience, model, rate_limiter=self.rate_limiter)
+            elif self.rate_limiter is not None:
+                transport = RateLimitedTransport(transport, self.rate_limiter)
+                async_transport = AsyncRateLimitedTransport(async_transport, self.rate_limiter)
+            self._clients[model] = (
+                httpx.Client(transport=transport),
+                httpx.AsyncClient(transport=async_transport),
+            )
+        return self._clients[model]
+
+    def get(self, model: str, **kwargs) -> "ChatOpenAI":
+        """Return the shared client for a model id and ChatOpenAI parameters (e.g. temperature, cache)."""
+
+        key = (model, tuple(sorted(kwargs.items(), key=lambda item: item[0])))
+
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = self._create_model(model, **kwargs)
+            return self._models[key]
+
+    def _create_model(self, model: str, **kwargs) -> "ChatOpenAI":
+        # Imported on first use: langchain_openai (and the openai SDK) dominate the import time of the graphs
+        from langchain_openai import ChatOpenAI
+
+        http_client, http_async_client = self._http_clients(model)
+        # The SDK sends its own timeout with every request, replacing the client's: no pool timeout,
+        # so over the concurrency limit requests queue for a connection
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        if self.resilience is not None:
+            kwargs.setdefault("max_retries", 0)
+        return ChatOpenAI(
+            model=model,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            **kwargs,
+        )
+
+    def close(self):
+        """Close the sync connection pools and forget the clients.
+
+        Async pools cannot be closed outside their event loop: call aclose() from the loop using
+        them; the pools of other loops are released when their sockets are garbage collected.
+        """
+
+        with self._lock:
+            for http_client, _ in self._clients.values():
+                http_client.close()
+            self._clients.clear()
+            self._models.clear()
+
+    async def aclose(self):
+        """Close all connection pools: the sync ones and the async ones of the running event loop."""
+
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._models.clear()
+        for http_client, http_async_client in clients:
+            http_client.close()
+            await http_async_client.aclose()
+
+
+# Process-wide registry used when no registry is passed to the graph builders
+default_registry = ModelRegistry()
+
+
+def get_chat_model(model: str, registry: Optional[ModelRegistry] = None, **kwargs) -> "ChatOpenAI":
+    """Return a shared chat model from the given (or default) registry."""
+
+    return (registry or default_registry).get(model, **kwargs)
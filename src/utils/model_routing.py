@@ -0,0 +1,47 @@
+from typing import TYPE_CHECKING, Dict, Optional
+
+from langchain_core.caches import BaseCache
+
+from src.utils.model_registry import ModelRegistry, get_chat_model
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+
+# Model used by each LLM-calling node (both the sync and async variants)
+DEFAULT_MODEL_ROUTES = {
+    # Advice planning subgraph
+    "advice_planner": "gpt-4o-2024-11-20",
+    "feedback_generator": "gpt-4o-2024-11-20",
+    "plan_formatting": "gpt-4o-2024-11-20",
+    # Consultation subgraph
+    "question_generator": "gpt-4o-2024-11-20",
+    "query_constructor": "gpt-4o-2024-11-20",
+    "answer_generator": "gpt-4o-2024-11-20",
+    "generate_summary": "gpt-4.1-mini-2025-04-14",
+    "section_writer": "gpt-4o-2024-11-20",
+    "section_preprocessor": "gpt-4.1-mini-2025-04-14",
+    # Main graph (also used by the plan_writer node of the incremental assembly, when it falls back to the LLM)
+    "plan_writer": "gpt-5-mini-2025-08-07",
+}
+
+
+class ModelRoutes:
+    """Per-node model routing table: DEFAULT_MODEL_ROUTES with the given node -> model id overrides.
+
+    Nodes routed to the same model share one client of the model registry.
+    """
+
+    def __init__(self, routes: Optional[Dict[str, str]] = None):
+        unknown = set(routes or {}) - set(DEFAULT_MODEL_ROUTES)
+        if unknown:
+            raise ValueError(f"Unknown nodes in model routes: {', '.join(sorted(unknown))}")
+        self.routes = {**DEFAULT_MODEL_ROUTES, **(routes or {})}
+
+    def model(self, node: str) -> str:
+        return self.routes[node]
+
+    def chat_model(self, node: str, registry: Optional[ModelRegistry] = None, llm_cache: Optional[BaseCache] = None) -> "ChatOpenAI":
+        """The shared (temperature 0) chat model of a node."""
+
+        return get_chat_model(self.routes[node], registry=registry, temperature=0, cache=llm_cache)
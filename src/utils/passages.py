@@ -0,0 +1,86 @@
+import math
+import re
+from collections import Counter
+from typing import Iterable, Iterator, List
+
+from src.utils.prefetch import STOPWORDS
+
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase content words of a text, with repetitions (for term frequencies)."""
+
+    return [word for word in re.findall(r"[a-z0-9][a-z0-9\-]+", text.lower()) if word not in STOPWORDS]
+
+
+def iter_passages(text: str, max_chars: int = 500) -> Iterator[str]:
+    """Split a text into passages of up to max_chars characters, lazily.
+
+    Paragraphs are packed together while they fit; longer paragraphs are split between sentences,
+    and sentences longer than max_chars are cut.
+    """
+
+    passage = ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        pieces = [paragraph] if len(paragraph) <= max_chars else SENTENCE_END.split(paragraph)
+        for piece in pieces:
+            while len(piece) > max_chars:
+                if passage:
+                    yield passage
+                    passage = ""
+                yield piece[:max_chars]
+                piece = piece[max_chars:]
+            if passage and len(passage) + 1 + len(piece) > max_chars:
+                yield passage
+                passage = ""
+            passage = f"{passage} {piece}" if passage else piece
+    if passage:
+        yield passage
+
+
+def bm25_scores(query: str, passages: List[str], k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """Okapi BM25 score of every passage for the query, with document frequencies taken over the passages."""
+
+    query_words = set(tokenize(query))
+    if not query_words or not passages:
+        return [0.0] * len(passages)
+
+    term_counts = [Counter(word for word in tokenize(passage) if word in query_words) for passage in passages]
+    lengths = [len(tokenize(passage)) for passage in passages]
+    average_length = sum(lengths) / len(lengths) or 1
+    frequencies = Counter(word for counts in term_counts for word in counts)
+
+    scores = []
+    for counts, length in zip(term_counts, lengths):
+        score = 0.0
+        for word, count in counts.items():
+            idf = math.log(1 + (len(passages) - frequencies[word] + 0.5) / (frequencies[word] + 0.5))
+            score += idf * count * (k1 + 1) / (count + k1 * (1 - b + b * length / average_length))
+        scores.append(score)
+    return scores
+
+
+def top_passages(query: str, text: str, k: int = 3, max_chars: int = 500) -> List[str]:
+    """The k passages of a text most relevant to the query (BM25), in their order in the text.
+
+    Without any query word in the text, the opening passages are returned.
+    """
+
+    passages = list(iter_passages(text, max_chars))
+    scores = bm25_scores(query, passages)
+    if not any(scores):
+        return passages[:k]
+
+    best = sorted(range(len(passages)), key=lambda index: scores[index], reverse=True)[:k]
+    return [passages[index] for index in sorted(best) if scores[index] > 0]
+
+
+def join_passages(passages: Iterable[str]) -> str:
+    """Join selected passages, marking the gaps between them."""
+
+    return "\n[...]\n".join(passages)
@@ -0,0 +1,154 @@
+import re
+from itertools import combinations
+from typing import List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+# Markdown produced by the section_writer node
+SECTION_TITLE = re.compile(r"^##(?!#)\s*(.+?)\s*$", re.M)
+SUMMARY_HEADER = re.compile(r"^#{3,4}\s*Summary\s*$\n?", re.M | re.I)
+# "## Sources", but also "**Sources**" or "Sources:", which the prompt does not rule out
+SOURCES_HEADER = re.compile(r"^(?:#{2,4}\s*)?(?:\*\*)?\s*Sources\s*:?\s*(?:\*\*)?\s*:?\s*$", re.M | re.I)
+SOURCE_LINE = re.compile(r"^\s*\[(\d+)\]\s*(\S.*?)\s*$")
+CITATION = re.compile(r"([ \t]*)\[(\d+(?:\s*,\s*\d+)*)\]")
+WORD = re.compile(r"[a-z]{4,}")
+URL = re.compile(r"https?://[^\s<>()\]]+", re.I)
+TRACKING_PARAMS = {"fbclid", "gclid", "ref"}
+
+
+def canonical_url(source: str) -> str:
+    """Canonical form of a source used for deduplication (scheme, www., trailing slash and tracking parameters ignored)."""
+
+    url_match = URL.search(source)
+    if not url_match:
+        return " ".join(source.lower().split())
+
+    parts = urlsplit(url_match.group(0).rstrip(".,;"))
+    host = parts.netloc.lower().removeprefix("www.")
+    path = parts.path.rstrip("/")
+    query = urlencode([
+        (key, value) for key, value in parse_qsl(parts.query)
+        if not (key.lower().startswith("utm_") or key.lower() in TRACKING_PARAMS)
+    ])
+
+    return urlunsplit(("https", host, path, query, ""))
+
+
+def parse_section(section: str) -> dict:
+    """Split a written section into its title, body (without the Summary header) and numbered sources."""
+
+    title_match = SECTION_TITLE.search(section)
+    title = title_match.group(1) if title_match else ""
+    content = section[title_match.end():] if title_match else section
+
+    # Everything after the Sources header is the list of sources
+    sources = []
+    sources_match = SOURCES_HEADER.search(content)
+    if sources_match:
+        for line in content[sources_match.end():].splitlines():
+            source_match = SOURCE_LINE.match(line)
+            if source_match:
+                sources.append([int(source_match.group(1)), source_match.group(2)])
+        content = content[:sources_match.start()]
+
+    body = SUMMARY_HEADER.sub("", content).strip()
+
+    return {"title": title, "body": body, "sources": sources}
+
+
+def renumber_citations(body: str, numbering: dict) -> str:
+    """Replace local citation numbers in a section body with their plan-wide numbers.
+
+    Citations of numbers missing from the section's own sources are dropped: kept as they are,
+    they would point at another section's source once the sources are merged.
+    """
+
+    def replace(match):
+        numbers = [int(number) for number in re.split(r"\s*,\s*", match.group(2))]
+        renumbered = []
+        for number in numbers:
+            new_number = numbering.get(number)
+            if new_number is not None and new_number not in renumbered:
+                renumbered.append(new_number)
+        if not renumbered:
+            return ""
+        return match.group(1) + "[" + ", ".join(str(number) for number in renumbered) + "]"
+
+    return CITATION.sub(replace, body)
+
+
+def missing_sources(parts: List[dict]) -> List[str]:
+    """Titles of the sections citing sources without a Sources list that could be parsed."""
+
+    return [part["title"] for part in parts if not part["sources"] and CITATION.search(part["body"])]
+
+
+def merge_sources(parts: List[dict]):
+    """Assign plan-wide source numbers, deduplicating sources across sections by canonical URL.
+
+    Returns the renumbered section bodies and the consolidated list of sources. The bodies of
+    sections without a parsed Sources list are kept unchanged rather than losing their citations.
+    """
+
+    consolidated = [] # plan-wide list of sources, index + 1 is the citation number
+    index = {} # canonical source -> plan-wide number
+    bodies = []
+
+    for part in parts:
+        if not part["sources"]:
+            bodies.append(part["body"])
+            continue
+        numbering = {}
+        for number, source in part["sources"]:
+            key = canonical_url(source)
+            if key not in index:
+                consolidated.append(source)
+                index[key] = len(consolidated)
+            numbering[number] = index[key]
+        bodies.append(renumber_citations(part["body"], numbering))
+
+    return bodies, consolidated
+
+
+def section_similarity(first: str, second: str) -> float:
+    """Jaccard similarity of the content words of two section bodies."""
+
+    first_words, second_words = set(WORD.findall(first.lower())), set(WORD.findall(second.lower()))
+    if not first_words or not second_words:
+        return 0.0
+    return len(first_words & second_words) / len(first_words | second_words)
+
+
+def find_duplicate_sections(parts: List[dict], threshold: float = 0.5) -> List[tuple]:
+    """Return the pairs of section titles whose bodies overlap above the threshold."""
+
+    return [
+        (first["title"], second["title"])
+        for first, second in combinations(parts, 2)
+        if section_similarity(first["body"], second["body"]) >= threshold
+    ]
+
+
+def sources_section(sources: List[str]) -> str:
+    """Format the consolidated list of sources (two trailing spaces keep one source per line in Markdown)."""
+
+    sources_list = "\n".join(f"[{number}] {source}  " for number, source in enumerate(sources, start=1))
+    return f"## Sources\n\n{sources_list}\n"
+
+
+def strip_sources(plan: str) -> str:
+    """Remove any Sources section from a generated plan, so the consolidated one can be appended."""
+
+    sources_match = SOURCES_HEADER.search(plan)
+    return plan[:sources_match.start()].rstrip() if sources_match else plan.rstrip()
+
+
+def stitch_plan(parts: List[dict]) -> str:
+    """Assemble pre-processed sections into the final Wellbeing Action Plan."""
+
+    bodies, sources = merge_sources(parts)
+
+    summary = "\n".join(f"- **{part['title']}**: {part['summary']}" for part in parts)
+    sections = "\n\n".join(f"## {part['title']}\n\n{body}" for part, body in zip(parts, bodies))
+
+    return f"# Personalised Wellbeing Action Plan\n\n## Summary\n\n{summary}\n\n{sections}\n\n{sources_section(sources)}"
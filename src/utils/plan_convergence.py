@@ -0,0 +1,45 @@
+import re
+from typing import List, Tuple
+
+from src.utils.plan_assembly import section_similarity
+
+
+# Steps as drafted by the advice_planner node
+PLAN_STEP = re.compile(r"Theme:\s*(.+?)\s*\n\s*Helpful tip:\s*(.+?)\s*$", re.M | re.I)
+
+
+def parse_plan_steps(plan: str) -> List[Tuple[str, str]]:
+    """Extract the (theme, helpful tip) pairs of a drafted plan."""
+
+    return PLAN_STEP.findall(plan)
+
+
+def step_similarity(first: Tuple[str, str], second: Tuple[str, str]) -> float:
+    """Similarity of two steps, weighting their themes and helpful tips equally."""
+
+    theme_similarity = 1.0 if first[0].strip().lower() == second[0].strip().lower() else section_similarity(first[0], second[0])
+    return (theme_similarity + section_similarity(first[1], second[1])) / 2
+
+
+def plan_change(previous: str, current: str) -> float:
+    """Fraction of the plan that changed between two drafts (0 = same steps, 1 = nothing in common).
+
+    Each step of the current draft is matched with its most similar step of the previous one;
+    added or removed steps count as fully changed.
+    """
+
+    previous_steps, current_steps = parse_plan_steps(previous), parse_plan_steps(current)
+    # Unstructured drafts are compared as a whole
+    if not previous_steps or not current_steps:
+        return 1.0 - section_similarity(previous, current)
+
+    unmatched = list(previous_steps)
+    similarity = 0.0
+    for step in current_steps:
+        if not unmatched:
+            break
+        best = max(unmatched, key=lambda candidate: step_similarity(step, candidate))
+        similarity += step_similarity(step, best)
+        unmatched.remove(best)
+
+    return 1.0 - similarity / max(len(previous_steps), len(current_steps))
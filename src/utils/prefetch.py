@@ -0,0 +1,120 @@
+import asyncio
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+
+STOPWORDS = set(
+    "a an and are as at be by can could do for from how i in into is it its me my of on or that the their "
+    "them there these this to try was what when which while who why will with you your about more most "
+    "some such than then they very also just like help helps theme helpful tip".split()
+)
+
+
+def query_terms(text: str) -> list:
+    """Lowercase content words of a text, in order and without duplicates."""
+
+    words = re.findall(r"[a-z][a-z\-]+", text.lower())
+    return list(dict.fromkeys(word for word in words if word not in STOPWORDS))
+
+
+def query_similarity(first: str, second: str) -> float:
+    """Jaccard similarity of the content words of two queries."""
+
+    first_terms, second_terms = set(query_terms(first)), set(query_terms(second))
+    if not first_terms or not second_terms:
+        return 0.0
+    return len(first_terms & second_terms) / len(first_terms | second_terms)
+
+
+def predict_search_queries(step, summary: str = "", max_terms: int = 6) -> Tuple[str, str]:
+    """Guess the web and Wikipedia queries of the next consultation cycle without an LLM call.
+
+    The web query combines the step theme with key terms of its helpful tip (and of the
+    latest summary sentence), while the Wikipedia query stays short, as the consultation
+    subgraph's query_instructions ask of the wiki_query.
+    """
+
+    sentences = [sentence for sentence in re.split(r"(?<=[.!?])\s+", summary.strip()) if sentence]
+    latest_summary = sentences[-1] if sentences else ""
+    terms = query_terms(f"{step.theme} {step.helpful_tip} {latest_summary}")[:max_terms]
+
+    return " ".join(terms), step.theme
+
+
+class SearchPrefetcher:
+    """Speculatively runs predicted searches in the background while a cycle's LLM calls are in flight.
+
+    A prefetched result is only used if the real query is similar enough to the predicted one;
+    otherwise the search node falls back to a normal search (the speculative result still warms
+    the search cache when one is configured).
+    """
+
+    def __init__(self, similarity_threshold: float = 0.4, max_workers: int = 8, max_pending: int = 1024):
+        self.similarity_threshold = similarity_threshold
+        self.max_pending = max_pending
+        self.hits = 0 # prefetched results used
+        self.misses = 0 # prefetched results discarded (query mismatch or failure)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search-prefetch")
+        self._pending = OrderedDict() # (branch, source) -> (predicted query, future)
+        self._lock = threading.Lock()
+
+    def prefetch(self, branch: str, source: str, query: str, fetch: Callable[[], object]):
+        """Start fetching results for a predicted query in the background."""
+
+        if not query:
+            return
+        future = self._executor.submit(fetch)
+
+        with self._lock:
+            self._pending[(branch, source)] = (query, future)
+            self._pending.move_to_end((branch, source))
+            # Drop predictions of branches that never used them (e.g. concluded consultations)
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+
+    def _pop(self, branch: str, source: str, query: str) -> Optional[Future]:
+        with self._lock:
+            pending = self._pending.pop((branch, source), None)
+        if pending is None:
+            return None
+
+        predicted_query, future = pending
+        if query_similarity(query, predicted_query) < self.similarity_threshold:
+            with self._lock:
+                self.misses += 1
+            return None
+        return future
+
+    def _result(self, future: Future):
+        if future.exception() is not None:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return future.result()
+
+    def take(self, branch: str, source: str, query: str):
+        """Return the prefetched results if the real query matches the prediction, otherwise None."""
+
+        future = self._pop(branch, source, query)
+        if future is None:
+            return None
+        future.exception() # wait for the background search to finish
+        return self._result(future)
+
+    async def atake(self, branch: str, source: str, query: str):
+        """Async variant of take; waits for the background search without blocking the event loop."""
+
+        future = self._pop(branch, source, query)
+        if future is None:
+            return None
+        await asyncio.wrap_future(future)
+        return self._result(future)
+
+    def stats(self) -> dict:
+        used = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / used if used else 0.0}
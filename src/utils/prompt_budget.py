@@ -0,0 +1,186 @@
+import math
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+from src.utils.prefetch import query_terms
+
+
+TRUNCATION_MARKER = " [...]"
+# Per-message overhead of the chat format (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Below this, a document or turn is dropped rather than truncated to a stub
+MIN_PART_TOKENS = 64
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """The o200k_base tokenizer used by the gpt-4o / gpt-4.1 / gpt-5 models, or None if it cannot be loaded
+    (tiktoken downloads the encoding on first use, which fails offline)."""
+
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens of a text, estimated at ~4 characters per token when the tokenizer is unavailable."""
+
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[BaseMessage]) -> int:
+    return sum(count_tokens(message.text) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut a text to at most max_tokens tokens, marking the cut."""
+
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max(max_tokens - count_tokens(TRUNCATION_MARKER), 0)
+
+    encoding = _encoding()
+    if encoding is None:
+        truncated = text[:keep * 4]
+        # Do not end in the middle of a word
+        if " " in truncated:
+            truncated = truncated.rsplit(" ", 1)[0]
+    else:
+        truncated = encoding.decode(encoding.encode(text, disallowed_special=())[:keep])
+
+    return truncated.rstrip() + TRUNCATION_MARKER
+
+
+def fit_recent_messages(messages: List[BaseMessage], max_tokens: int) -> List[BaseMessage]:
+    """Keep the most recent messages fitting in max_tokens.
+
+    The latest message is always kept (truncated if needed), and the oldest kept message may be
+    truncated rather than dropped.
+    """
+
+    kept = []
+    remaining = max_tokens
+    for message in reversed(messages):
+        tokens = count_tokens(message.text) + MESSAGE_OVERHEAD_TOKENS
+        if tokens <= remaining:
+            kept.append(message)
+            remaining -= tokens
+            continue
+        if not kept or remaining - MESSAGE_OVERHEAD_TOKENS >= MIN_PART_TOKENS:
+            content = truncate_to_tokens(message.text, max(remaining - MESSAGE_OVERHEAD_TOKENS, MIN_PART_TOKENS))
+            kept.append(message.model_copy(update={"content": content}))
+        break
+
+    return kept[::-1]
+
+
+def fit_recent_texts(texts: List[str], max_tokens: int) -> List[str]:
+    """Keep the most recent texts fitting in max_tokens (same policy as fit_recent_messages)."""
+
+    kept = []
+    remaining = max_tokens
+    for text in reversed(texts):
+        tokens = count_tokens(text)
+        if tokens <= remaining:
+            kept.append(text)
+            remaining -= tokens
+            continue
+        if not kept or remaining >= MIN_PART_TOKENS:
+            kept.append(truncate_to_tokens(text, max(remaining, MIN_PART_TOKENS)))
+        break
+
+    return kept[::-1]
+
+
+def relevance(query: str, text: str) -> float:
+    """Fraction of the query's content words found in a text."""
+
+    terms = query_terms(query)
+    if not terms:
+        return 0.0
+    words = set(query_terms(text))
+    return sum(term in words for term in terms) / len(terms)
+
+
+def fit_documents(documents: List[str], max_tokens: int, query: str = "") -> List[str]:
+    """Select the documents most relevant to the query within max_tokens, most relevant first.
+
+    Documents are taken in order of relevance (ties keep their original order); one that does not
+    fit is truncated to the remaining budget, or skipped when too little of it is left.
+    """
+
+    ranked = sorted(documents, key=lambda document: relevance(query, document), reverse=True)
+
+    selected = []
+    remaining = max_tokens
+    for document in ranked:
+        tokens = count_tokens(document)
+        if tokens <= remaining:
+            selected.append(document)
+            remaining -= tokens
+        elif remaining >= MIN_PART_TOKENS:
+            selected.append(truncate_to_tokens(document, remaining))
+            remaining = 0
+
+    return selected
+
+
+class NodeBudget:
+    """Prompt budget of one node: a total in tokens, shared between the variable parts of its prompt.
+
+    The fixed instructions are paid for first. The rest is split according to the shares of the parts;
+    a part needing less than its share passes the difference on to the others.
+    """
+
+    def __init__(self, total: int, shares: Dict[str, float]):
+        self.total = total
+        self.shares = shares
+
+    def allocate(self, instructions: str, needs: Dict[str, int]) -> Dict[str, int]:
+        """Token budget of each part, given the tokens each part would need untrimmed."""
+
+        available = max(self.total - count_tokens(instructions), 0)
+        budgets = {}
+        pending = {part: need for part, need in needs.items() if self.shares.get(part, 0) > 0}
+
+        # Water-filling: satisfy the parts fitting in their share, then share what is left among the others
+        while pending:
+            total_share = sum(self.shares[part] for part in pending)
+            allotments = {part: int(available * self.shares[part] / total_share) for part in pending}
+            satisfied = {part: need for part, need in pending.items() if need <= allotments[part]}
+            if not satisfied:
+                budgets.update(allotments)
+                break
+            for part, need in satisfied.items():
+                budgets[part] = need
+                available -= need
+                del pending[part]
+
+        return budgets
+
+
+DEFAULT_NODE_BUDGETS = {
+    # Practitioner answer: the client's problem and answering rules are fixed; the current cycle's documents get the largest share
+    "answer_generator": NodeBudget(total=6000, shares={"summary": 0.1, "conversation": 0.3, "documents": 0.6}),
+    # Plan section: everything but the writing instructions and the step is transcript
+    "section_writer": NodeBudget(total=8000, shares={"transcript": 1.0}),
+}
+
+
+class PromptBudgets:
+    """Per-node prompt budgets (defaults to DEFAULT_NODE_BUDGETS, overridden per node name)."""
+
+    def __init__(self, budgets: Optional[Dict[str, NodeBudget]] = None):
+        self.budgets = {**DEFAULT_NODE_BUDGETS, **(budgets or {})}
+
+    def allocate(self, node: str, instructions: str, needs: Dict[str, int]) -> Dict[str, int]:
+        return self.budgets[node].allocate(instructions, needs)
@@ -0,0 +1,296 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import httpx
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate.
+
+    Reservations are taken immediately and may drive the level negative; the caller then
+    sleeps for the returned wait time. This keeps acquisition to a single locked call.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0 # units per second
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Reserve amount units and return the seconds to wait before using them."""
+
+        with self._lock:
+            self._refill()
+            self.level -= amount
+            return max(0.0, -self.level / self.rate)
+
+    def sync(self, remaining: float):
+        """Align the bucket with the remaining quota reported by the provider."""
+
+        with self._lock:
+            self._refill()
+            self.level = min(self.level, remaining)
+
+    def available(self) -> float:
+        """Units that can be reserved without waiting."""
+
+        with self._lock:
+            self._refill()
+            return self.level
+
+    def pause(self, seconds: float):
+        """Block new reservations for the given number of seconds (e.g. after a 429)."""
+
+        with self._lock:
+            self._refill()
+            self.level = min(self.level, -seconds * self.rate)
+
+
+class RateLimiter:
+    """Per-provider rate limiter (requests/min and tokens/min) with adaptive concurrency.
+
+    The concurrency limit follows AIMD: it grows by roughly one slot per window of successful
+    requests and is halved (at most once per cooldown) when the provider answers 429, so
+    throughput settles just under the quota instead of oscillating between bursts and retries.
+    Callers waiting for a slot (sync or async) are served in arrival order.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 30_000,
+        initial_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        backoff_cooldown: float = 5.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency_limit = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.backoff_cooldown = backoff_cooldown # seconds between two multiplicative decreases
+        self.in_flight = 0
+        self.rate_limited = 0 # number of 429 responses seen
+        self._last_backoff = 0.0
+        self._waiters = deque() # grant callbacks of the callers waiting for a slot, oldest first
+        self._condition = threading.Condition()
+
+    def _has_free_slot(self) -> bool:
+        return self.in_flight < int(self.concurrency_limit)
+
+    def _grant_waiters(self):
+        """Hand the free slots to the oldest waiters (called with the lock held)."""
+
+        while self._waiters and self._has_free_slot():
+            grant = self._waiters.popleft()
+            self.in_flight += 1
+            if not grant():
+                self.in_flight -= 1 # the waiter's event loop is gone
+        self._condition.notify_all()
+
+    def _enter_or_wait(self, grant: Callable[[], bool]) -> bool:
+        """Take a slot at once (True) or queue the grant callback behind the other waiters (called with the lock held)."""
+
+        if not self._waiters and self._has_free_slot():
+            self.in_flight += 1
+            return True
+        self._waiters.append(grant)
+        return False
+
+    def _reserve(self, tokens: int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    def acquire(self, tokens: int):
+        """Block until a request with the estimated number of tokens may be sent."""
+
+        granted = threading.Event()
+
+        def grant():
+            granted.set()
+            return True
+
+        with self._condition:
+            if not self._enter_or_wait(grant):
+                while not granted.is_set():
+                    self._condition.wait()
+        wait = self._reserve(tokens)
+        if wait:
+            try:
+                time.sleep(wait)
+            except BaseException:
+                self.release()
+                raise
+
+    async def aacquire(self, tokens: int):
+        """Async variant of acquire; waits without blocking the event loop.
+
+        A caller cancelled while waiting (for a slot or for the token buckets) gives its slot back.
+        """
+
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant():
+            try:
+                loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+            except RuntimeError:
+                return False
+            return True
+
+        with self._condition:
+            entered = self._enter_or_wait(grant)
+        if not entered:
+            try:
+                await granted
+            except BaseException:
+                with self._condition:
+                    if grant in self._waiters:
+                        self._waiters.remove(grant)
+                        raise
+                # The slot was granted just before the cancellation
+                self.release()
+                raise
+
+        wait = self._reserve(tokens)
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                self.release()
+                raise
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Take a slot only if one is free at once and the token buckets cover the request (e.g. for a hedged duplicate)."""
+
+        with self._condition:
+            if self._waiters or not self._has_free_slot():
+                return False
+            if self.requests.available() < 1 or self.tokens.available() < tokens:
+                return False
+            self.in_flight += 1
+        self._reserve(tokens)
+        return True
+
+    def release(self, status_code: Optional[int] = None, headers: Optional[httpx.Headers] = None):
+        """Free the concurrency slot and adapt the limits to the provider response."""
+
+        with self._condition:
+            self.in_flight -= 1
+
+            if status_code == 429:
+                self.rate_limited += 1
+                now = time.monotonic()
+                if now - self._last_backoff > self.backoff_cooldown:
+                    self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+                    self._last_backoff = now
+            elif status_code is not None and status_code < 400:
+                self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1 / self.concurrency_limit)
+
+            self._grant_waiters()
+
+        if headers is not None:
+            self._apply_headers(status_code, headers)
+
+    def release_response(self, response: Optional[httpx.Response]):
+        """release() for the outcome of a request: its response, or None when it failed or was cancelled."""
+
+        if response is None:
+            self.release()
+        else:
+            self.release(response.status_code, response.headers)
+
+    def _apply_headers(self, status_code: Optional[int], headers: httpx.Headers):
+        # OpenAI reports the remaining quota on every response
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_requests is not None and remaining_requests.isdigit():
+            self.requests.sync(float(remaining_requests))
+        if remaining_tokens is not None and remaining_tokens.isdigit():
+            self.tokens.sync(float(remaining_tokens))
+
+        if status_code == 429:
+            retry_after = headers.get("retry-after")
+            try:
+                seconds = float(retry_after) if retry_after is not None else 1.0
+            except ValueError:
+                seconds = 1.0
+            self.requests.pause(seconds)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": int(self.concurrency_limit),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "rate_limited": self.rate_limited,
+        }
+
+
+def estimate_request_tokens(request: httpx.Request) -> int:
+    """Estimate the tokens a chat completion request counts against the quota (~4 bytes per prompt token)."""
+
+    content = request.content or b""
+    tokens = len(content) // 4
+
+    # Completion tokens also count against the quota when a cap is set
+    try:
+        body = json.loads(content) if content else {}
+    except ValueError:
+        body = {}
+    if isinstance(body, dict):
+        tokens += body.get("max_completion_tokens") or body.get("max_tokens") or 0
+
+    return tokens
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """httpx transport applying a RateLimiter around every request."""
+
+    def __init__(self, transport: httpx.BaseTransport, limiter: RateLimiter):
+        self.transport = transport
+        self.limiter = limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.limiter.acquire(estimate_request_tokens(request))
+        response = None
+        try:
+            response = self.transport.handle_request(request)
+            return response
+        finally:
+            self.limiter.release_response(response)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """Async variant of RateLimitedTransport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: RateLimiter):
+        self.transport = transport
+        self.limiter = limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # aacquire gives the slot back itself when cancelled during its waits
+        await self.limiter.aacquire(estimate_request_tokens(request))
+        response = None
+        try:
+            response = await self.transport.handle_async_request(request)
+            return response
+        finally:
+            # Also on cancellation (asyncio.CancelledError is not an Exception)
+            self.limiter.release_response(response)
+
+    async def aclose(self):
+        await self.transport.aclose()
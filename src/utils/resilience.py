@@ -0,0 +1,407 @@
+import asyncio
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from src.utils.metrics import MetricsRegistry
+from src.utils.rate_limiting import RateLimiter, estimate_request_tokens
+
+
+# Provider answers worth retrying: timeouts, conflicts, rate limits and server errors
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# Transient network failures, including those of client libraries imported only when used
+# (openai APITimeoutError/APIConnectionError, requests ConnectionError/Timeout, aiohttp ClientConnectionError)
+TRANSIENT_ERRORS = (TimeoutError, ConnectionError, httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+TRANSIENT_ERROR_NAMES = {"APITimeoutError", "APIConnectionError", "ConnectionError", "Timeout", "ClientConnectionError"}
+
+# Deadlines of the operations slower than the default: non-streamed completions of the reasoning model
+DEFAULT_TIMEOUTS = {"gpt-5-mini-2025-08-07": 300.0}
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of an API error (openai, httpx and requests errors), if any."""
+
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Only transient failures are retried: timeouts, connection errors and RETRY_STATUSES answers.
+
+    Anything else (authentication, validation or content-filter errors, bugs in a search client) fails at once.
+    """
+
+    status = status_code(error)
+    if status is not None:
+        return status in RETRY_STATUSES
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class ResiliencePolicy:
+    """Deadlines, jittered exponential retries and hedged requests for LLM and search calls.
+
+    Every attempt must finish within timeout seconds, or timeouts[operation] for the operations
+    listed there (DEFAULT_TIMEOUTS gives the slower reasoning model more time, so its long
+    completions are not paid for again after a timeout); failed or timed-out attempts are retried up
+    to max_retries times after a random delay of up to backoff * 2^retry seconds (full jitter,
+    capped at max_backoff). Once hedge_min_samples latencies of an operation were observed, an
+    attempt still running after their hedge_quantile (p95 by default) is hedged: a duplicate
+    request is sent and the first one to succeed is used, so a single slow request no longer
+    holds up the whole graph. Latencies are tracked per operation (model id, search provider).
+
+    The deadline and the hedge timer start once an attempt is actually sent: time spent waiting
+    for a rate limiter slot (the acquire hook) or for a free worker thread is not counted, and a
+    hedge is only sent when try_acquire grants a slot at once, so throttled calls are neither
+    hedged nor retried for requests that never left.
+
+    Sync calls run their attempts on a thread pool of max_workers threads per operation (a
+    timed-out or losing attempt finishes in the background and its result is discarded); async
+    attempts are tasks cancelled when they lose or time out.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 60.0,
+        timeouts: Optional[Dict[str, float]] = None,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        hedge_quantile: Optional[float] = 0.95,
+        hedge_min_samples: int = 20,
+        latency_window: int = 200,
+        max_workers: int = 32,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        self.timeout = timeout
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})} # operation -> seconds
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_quantile = hedge_quantile # None disables hedging
+        self.hedge_min_samples = hedge_min_samples
+        self.metrics = metrics
+        self.counts = defaultdict(int) # calls, retries, timeouts, hedges, hedges_won, failures
+        self._latencies = defaultdict(lambda: deque(maxlen=latency_window)) # operation -> recent successful attempt latencies
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executors = {} # operation -> ThreadPoolExecutor
+
+    # Bookkeeping
+
+    def _count(self, event: str, operation: str):
+        with self._lock:
+            self.counts[event] += 1
+        if self.metrics is not None:
+            self.metrics.increment(f"resilience_{event}_total", help=f"LLM and search calls: {event.replace('_', ' ')}", operation=operation)
+
+    def _record_latency(self, operation: str, seconds: float):
+        with self._lock:
+            self._latencies[operation].append(seconds)
+
+    def hedge_delay(self, operation: str) -> Optional[float]:
+        """Seconds after which an attempt of the operation is hedged (None until enough latencies were observed)."""
+
+        if self.hedge_quantile is None:
+            return None
+        with self._lock:
+            latencies = sorted(self._latencies[operation])
+        if len(latencies) < self.hedge_min_samples:
+            return None
+        return latencies[min(int(self.hedge_quantile * len(latencies)), len(latencies) - 1)]
+
+    def timeout_for(self, operation: str) -> float:
+        """Deadline of one attempt of the operation (seconds)."""
+
+        return self.timeouts.get(operation, self.timeout)
+
+    def _retry_delay(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** retry))
+
+    # Sync calls
+
+    def _executor(self, operation: str) -> ThreadPoolExecutor:
+        # One pool per operation, so a slow provider cannot take the threads of the others
+        with self._lock:
+            if operation not in self._executors:
+                self._executors[operation] = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"resilience-{operation}")
+            return self._executors[operation]
+
+    def _timed(self, operation: str, fn: Callable[[], Any], running: Optional[threading.Event] = None):
+        if running is not None:
+            running.set()
+        started = time.monotonic()
+        result = fn()
+        self._record_latency(operation, time.monotonic() - started)
+        return result
+
+    def _attempt(self, operation: str, fn: Callable[[], Any], discard: Optional[Callable[[Any], None]], acquire: Optional[Callable[[], Any]], try_acquire: Optional[Callable[[], bool]]):
+        """One attempt, hedged if it is slower than the operation's hedge delay."""
+
+        def discard_late(future):
+            if discard is not None and not future.cancelled() and future.exception() is None:
+                discard(future.result())
+
+        if acquire is not None:
+            acquire()
+        executor = self._executor(operation)
+        running = threading.Event()
+        pending = {executor.submit(self._timed, operation, fn, running)}
+        running.wait()
+        timeout = self.timeout_for(operation)
+        deadline = time.monotonic() + timeout
+        hedge = None
+
+        delay = self.hedge_delay(operation)
+        if delay is not None and delay < timeout:
+            done, _ = wait(pending, timeout=delay)
+            if not done and (try_acquire is None or try_acquire()):
+                hedge = executor.submit(self._timed, operation, fn)
+                pending.add(hedge)
+                self._count("hedges", operation)
+
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            winner = next((future for future in done if future.exception() is None), None)
+            if winner is not None:
+                if winner is hedge:
+                    self._count("hedges_won", operation)
+                # The other request finishes in the background
+                for loser in (done | pending) - {winner}:
+                    loser.add_done_callback(discard_late)
+                return winner.result()
+            error = next(iter(done)).exception()
+
+        if error is not None and not pending:
+            raise error
+        for late in pending:
+            late.add_done_callback(discard_late)
+        self._count("timeouts", operation)
+        raise TimeoutError(f"{operation} did not answer within {timeout}s")
+
+    def call(
+        self,
+        operation: str,
+        fn: Callable[[], Any],
+        discard: Optional[Callable[[Any], None]] = None,
+        acquire: Optional[Callable[[], Any]] = None,
+        try_acquire: Optional[Callable[[], bool]] = None,
+    ):
+        """Run fn() with the deadline, retries and hedging of the policy.
+
+        discard receives the results of attempts finishing after another one was used (e.g. to close HTTP responses).
+        acquire blocks until an attempt may be sent (e.g. a rate limiter slot) and try_acquire takes a
+        slot for a hedge without waiting; fn must give back what they took.
+        """
+
+        self._count("calls", operation)
+        for retry in range(self.max_retries + 1):
+            try:
+                return self._attempt(operation, fn, discard, acquire, try_acquire)
+            except Exception as error:
+                if retry == self.max_retries or not is_retryable(error):
+                    self._count("failures", operation)
+                    raise
+            self._count("retries", operation)
+            time.sleep(self._retry_delay(retry))
+
+    # Async calls
+
+    async def _atimed(self, operation: str, afn: Callable[[], Awaitable[Any]]):
+        started = time.monotonic()
+        result = await afn()
+        self._record_latency(operation, time.monotonic() - started)
+        return result
+
+    async def _aattempt(
+        self,
+        operation: str,
+        afn: Callable[[], Awaitable[Any]],
+        discard: Optional[Callable[[Any], Any]],
+        acquire: Optional[Callable[[], Awaitable[Any]]],
+        try_acquire: Optional[Callable[[], bool]],
+    ):
+        if acquire is not None:
+            await acquire()
+        # No await between acquiring and starting the attempt, whose fn gives the slot back
+        timeout = self.timeout_for(operation)
+        deadline = time.monotonic() + timeout
+        pending = {asyncio.ensure_future(self._atimed(operation, afn))}
+        hedge = None
+
+        try:
+            delay = self.hedge_delay(operation)
+            if delay is not None and delay < timeout:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done and (try_acquire is None or try_acquire()):
+                    hedge = asyncio.ensure_future(self._atimed(operation, afn))
+                    pending.add(hedge)
+                    self._count("hedges", operation)
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    if winner is hedge:
+                        self._count("hedges_won", operation)
+                    for loser in done - {winner}:
+                        if discard is not None and loser.exception() is None:
+                            await discard(loser.result())
+                    return winner.result()
+                error = next(iter(done)).exception()
+
+            if error is not None and not pending:
+                raise error
+            self._count("timeouts", operation)
+            raise TimeoutError(f"{operation} did not answer within {timeout}s")
+        finally:
+            # Losing and timed-out attempts are cancelled
+            for task in pending:
+                task.cancel()
+
+    async def acall(
+        self,
+        operation: str,
+        afn: Callable[[], Awaitable[Any]],
+        discard: Optional[Callable[[Any], Awaitable[Any]]] = None,
+        acquire: Optional[Callable[[], Awaitable[Any]]] = None,
+        try_acquire: Optional[Callable[[], bool]] = None,
+    ):
+        """Async variant of call (discard and acquire are coroutine functions)."""
+
+        self._count("calls", operation)
+        for retry in range(self.max_retries + 1):
+            try:
+                return await self._aattempt(operation, afn, discard, acquire, try_acquire)
+            except Exception as error:
+                if retry == self.max_retries or not is_retryable(error):
+                    self._count("failures", operation)
+                    raise
+            self._count("retries", operation)
+            await asyncio.sleep(self._retry_delay(retry))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counts, "hedge_win_rate": self.counts["hedges_won"] / self.counts["hedges"] if self.counts["hedges"] else 0.0}
+
+    def close(self):
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=False)
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """httpx transport applying a ResiliencePolicy to every request (used for the chat model clients).
+
+    Responses with a retryable status (429, 5xx, ...) count as failed attempts; the last one is
+    returned when the retries are exhausted, so the SDK still raises its usual error.
+
+    With a rate_limiter, every attempt (retries and hedges included) takes a slot of it before the
+    policy starts its clock, and gives it back with the response, so 429s and retry-after pauses
+    slow down the retries instead of firing more of them.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, policy: ResiliencePolicy, operation: str, rate_limiter: Optional[RateLimiter] = None):
+        self.transport = transport
+        self.policy = policy
+        self.operation = operation
+        self.rate_limiter = rate_limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        last_response = None
+        limiter = self.rate_limiter
+        tokens = estimate_request_tokens(request)
+
+        def send():
+            nonlocal last_response
+            response = None
+            try:
+                response = self.transport.handle_request(request)
+            finally:
+                if limiter is not None:
+                    limiter.release_response(response)
+            if response.status_code in RETRY_STATUSES:
+                response.read()
+                last_response = response
+                raise httpx.HTTPStatusError(f"{response.status_code} from {request.url}", request=request, response=response)
+            return response
+
+        try:
+            return self.policy.call(
+                self.operation,
+                send,
+                discard=lambda response: response.close(),
+                acquire=(lambda: limiter.acquire(tokens)) if limiter is not None else None,
+                try_acquire=(lambda: limiter.try_acquire(tokens)) if limiter is not None else None,
+            )
+        except httpx.HTTPStatusError:
+            return last_response
+        except TimeoutError as error:
+            # Surfaced as an httpx timeout, which the SDK reports as APITimeoutError
+            raise httpx.ReadTimeout(str(error), request=request) from error
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncResilientTransport(httpx.AsyncBaseTransport):
+    """Async variant of ResilientTransport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: ResiliencePolicy, operation: str, rate_limiter: Optional[RateLimiter] = None):
+        self.transport = transport
+        self.policy = policy
+        self.operation = operation
+        self.rate_limiter = rate_limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        last_response = None
+        limiter = self.rate_limiter
+        tokens = estimate_request_tokens(request)
+
+        async def send():
+            nonlocal last_response
+            response = None
+            try:
+                response = await self.transport.handle_async_request(request)
+            finally:
+                # Also when the attempt is cancelled (lost a hedge race or timed out)
+                if limiter is not None:
+                    limiter.release_response(response)
+            if response.status_code in RETRY_STATUSES:
+                await response.aread()
+                last_response = response
+                raise httpx.HTTPStatusError(f"{response.status_code} from {request.url}", request=request, response=response)
+            return response
+
+        try:
+            return await self.policy.acall(
+                self.operation,
+                send,
+                discard=lambda response: response.aclose(),
+                acquire=(lambda: limiter.aacquire(tokens)) if limiter is not None else None,
+                try_acquire=(lambda: limiter.try_acquire(tokens)) if limiter is not None else None,
+            )
+        except httpx.HTTPStatusError:
+            return last_response
+        except TimeoutError as error:
+            raise httpx.ReadTimeout(str(error), request=request) from error
+
+    async def aclose(self):
+        await self.transport.aclose()
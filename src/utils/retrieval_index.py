@@ -0,0 +1,272 @@
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.passages import iter_passages, tokenize
+
+
+def stem(word: str) -> str:
+    """Crude suffix stripping, so that e.g. "exercises"/"exercise" and "breathing"/"breath" share features."""
+
+    for suffix in ("ing", "es", "ed", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+class HashingEmbedder:
+    """CPU-only text embeddings: signed feature hashing of content-word unigrams and bigrams, with sublinear counts.
+
+    Stopwords are dropped and words are stemmed, so short queries are not dominated by function
+    words. Needs no model download. Any LangChain Embeddings instance (embed_documents/embed_query)
+    can be used in its place for real semantic embeddings.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        words = [stem(word) for word in tokenize(text)]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in words + [f"{first} {second}" for first, second in zip(words, words[1:])]:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            vector[digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        # Sublinear term frequency
+        return (np.sign(vector) * np.log1p(np.abs(vector))).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def normalise_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def result_key(result: dict) -> str:
+    """URL identifying a cached search result (web results have a "url", Wikipedia pages a "source")."""
+
+    return result.get("url") or result.get("source", "")
+
+
+def result_passages(result: dict, passage_chars: int) -> List[str]:
+    """Texts of a search result embedded in the index: each passage of its content, prefixed with the title.
+
+    A whole page embedded as one vector is dominated by its length, so a short query scores low even
+    against a page about exactly that topic; passages keep relevant matches well above unrelated ones.
+    """
+
+    title = result.get("title", "")
+    content = result.get("content") or result.get("page_content", "")
+    return [f"{title}\n{passage}" for passage in iter_passages(content, passage_chars)] or [title]
+
+
+class RetrievalIndex:
+    """Local vector index of the search results fetched so far, shared by all consultations.
+
+    Every web and Wikipedia result is split into passages of up to passage_chars characters, each
+    embedded and stored as one row (a result is stored once per source URL, refreshed when fetched
+    again). lookup() returns the stored results whose best passage is most similar to a query, so
+    the search nodes can skip the live search when the index already holds relevant documents.
+
+    Indexes of up to exact_search_limit passages are searched exhaustively (a few milliseconds for
+    thousands of passages); past it, candidates come from random-hyperplane LSH (num_tables hash
+    tables of num_bits bits), which only finds matches reliably with dense embeddings, whose
+    relevant passages score far above min_similarity. min_similarity is calibrated for
+    HashingEmbedder on Wikipedia-style articles: relevant query/article pairs scored a median of
+    0.24 (11 of 13 at least 0.18) and no unrelated pair above 0.13 (see
+    benchmarks/calibrate_retrieval.py); raise it for dense embeddings. With a path, the index is
+    kept on disk as a single index.npz, loaded on start and saved every save_every added results
+    (and on save()).
+    """
+
+    def __init__(self, path: Optional[str] = None, embeddings=None, min_similarity: float = 0.18, passage_chars: int = 500, num_tables: int = 8, num_bits: int = 10, exact_search_limit: int = 100_000, save_every: int = 20, seed: int = 0):
+        self.path = Path(path) if path else None
+        self.embeddings = embeddings or HashingEmbedder()
+        self.min_similarity = min_similarity
+        self.passage_chars = passage_chars
+        self.exact_search_limit = exact_search_limit
+        self.save_every = save_every
+        self.seed = seed
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.hits = 0 # lookups answered from the index
+        self.misses = 0 # lookups falling back to a live search
+        self._lock = threading.Lock()
+
+        self._docs = [] # {"source": "web" | "wiki", "result": cacheable search result}
+        self._doc_ids = {} # (source, url) -> index in self._docs
+        self._doc_rows = {} # index in self._docs -> its passage rows
+        self._num_rows = 0
+        self._vectors = None # (capacity, dim) float32 matrix, the first _num_rows rows in use
+        self._row_docs = None # (capacity,) row -> index in self._docs (-1 once replaced by a refresh)
+        self._planes = None
+        self._buckets = [{} for _ in range(num_tables)] # LSH bucket -> rows, per table
+        self._unsaved = 0
+
+        if self.path is not None and (self.path / "index.npz").exists():
+            self._load()
+
+    # Storage
+
+    def _load(self):
+        with np.load(self.path / "index.npz") as stored:
+            vectors, rows = stored["vectors"], stored["rows"]
+            docs = json.loads(stored["docs"].tobytes())
+        # Group the passage rows by result
+        order = np.argsort(rows, kind="stable")
+        bounds = np.searchsorted(rows[order], np.arange(len(docs) + 1))
+        for number, doc in enumerate(docs):
+            self._insert(doc["source"], doc["result"], vectors[order[bounds[number]:bounds[number + 1]]])
+
+    def save(self):
+        """Write the index to its directory (atomically, so a crash never leaves a half-written index).
+
+        Vectors, rows and results go into one file replacing the previous one, so they always match.
+        Rows replaced by refreshed results are left out, so the saved index is compact.
+        """
+
+        if self.path is None:
+            return
+        with self._lock:
+            live = np.flatnonzero(self._row_docs[:self._num_rows] >= 0) if self._num_rows else np.zeros(0, dtype=np.int64)
+            self.path.mkdir(parents=True, exist_ok=True)
+            index_tmp = self.path / "index.npz.tmp"
+            with open(index_tmp, "wb") as file:
+                np.savez(
+                    file,
+                    vectors=self._vectors[live] if len(live) else np.zeros((0, 0), dtype=np.float32),
+                    rows=self._row_docs[live] if len(live) else np.zeros(0, dtype=np.int64),
+                    docs=np.frombuffer(json.dumps(self._docs).encode("utf-8"), dtype=np.uint8),
+                )
+            os.replace(index_tmp, self.path / "index.npz")
+            self._unsaved = 0
+
+    # Index structure
+
+    def _hashes(self, vectors: np.ndarray) -> np.ndarray:
+        """LSH bucket of each vector in every table, shape (len(vectors), num_tables)."""
+
+        bits = np.einsum("tbd,nd->ntb", self._planes, vectors) > 0
+        return bits.astype(np.int64) @ (1 << np.arange(self.num_bits, dtype=np.int64))
+
+    def _insert(self, source: str, result: dict, vectors: np.ndarray):
+        """Add or refresh one result with the vectors of its passages (the caller holds the lock or owns the index)."""
+
+        if self._vectors is None:
+            dim = vectors.shape[1]
+            self._vectors = np.zeros((64, dim), dtype=np.float32)
+            self._row_docs = np.full(64, -1, dtype=np.int64)
+            self._planes = np.random.default_rng(self.seed).standard_normal((self.num_tables, self.num_bits, dim)).astype(np.float32)
+
+        key = (source, result_key(result))
+        doc = self._doc_ids.get(key)
+        if doc is None:
+            doc = len(self._docs)
+            self._docs.append(None)
+            self._doc_ids[key] = doc
+        else:
+            # The passages of the previous version no longer match
+            old_rows = self._doc_rows[doc]
+            for row, buckets in zip(old_rows, self._hashes(self._vectors[old_rows])):
+                self._row_docs[row] = -1
+                for table, bucket in enumerate(buckets):
+                    self._buckets[table][int(bucket)].remove(row)
+        self._docs[doc] = {"source": source, "result": result}
+
+        first_row = self._num_rows
+        rows = list(range(first_row, first_row + len(vectors)))
+        # Grow the matrix geometrically
+        while rows[-1] >= self._vectors.shape[0]:
+            self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+            self._row_docs = np.concatenate([self._row_docs, np.full_like(self._row_docs, -1)])
+        self._vectors[first_row:first_row + len(vectors)] = vectors
+        self._row_docs[first_row:first_row + len(vectors)] = doc
+        self._num_rows += len(vectors)
+        self._doc_rows[doc] = rows
+        for row, buckets in zip(rows, self._hashes(vectors)):
+            for table, bucket in enumerate(buckets):
+                self._buckets[table].setdefault(int(bucket), []).append(row)
+
+    def _candidates(self, vector: np.ndarray) -> np.ndarray:
+        """Rows sharing an LSH bucket with the query in at least one table."""
+
+        rows = set()
+        for table, bucket in enumerate(self._hashes(vector[None, :])[0]):
+            rows.update(self._buckets[table].get(int(bucket), ()))
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+    # API
+
+    def add(self, source: str, results: List[dict]):
+        """Embed and store the passages of the results of a web ("web") or Wikipedia ("wiki") search."""
+
+        results = [result for result in results or [] if result_key(result)]
+        if not results:
+            return
+        passages = [result_passages(result, self.passage_chars) for result in results]
+        vectors = normalise_rows(np.asarray(self.embeddings.embed_documents([text for texts in passages for text in texts]), dtype=np.float32))
+
+        with self._lock:
+            start = 0
+            for result, texts in zip(results, passages):
+                self._insert(source, result, vectors[start:start + len(texts)])
+                start += len(texts)
+            self._unsaved += len(results)
+            save = self.path is not None and self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def search(self, source: str, query: str, k: int, exclude: Iterable[str] = ()) -> List[Tuple[float, dict]]:
+        """The k stored results of a source most similar to the query, as (cosine similarity of their best passage, result) pairs."""
+
+        vector = normalise_rows(np.asarray([self.embeddings.embed_query(query)], dtype=np.float32))[0]
+        exclude = set(exclude)
+
+        with self._lock:
+            if not self._num_rows:
+                return []
+            if self._num_rows <= self.exact_search_limit:
+                rows = np.arange(self._num_rows)
+            else:
+                rows = self._candidates(vector)
+            rows = rows[self._row_docs[rows] >= 0]
+            similarities = self._vectors[rows] @ vector
+
+            # Results in the order of their best passage
+            ranked, seen = [], set()
+            for index in np.argsort(-similarities):
+                doc = int(self._row_docs[rows[index]])
+                if doc in seen:
+                    continue
+                seen.add(doc)
+                stored = self._docs[doc]
+                if stored["source"] != source or result_key(stored["result"]) in exclude:
+                    continue
+                ranked.append((float(similarities[index]), stored["result"]))
+                if len(ranked) == k:
+                    break
+            return ranked
+
+    def lookup(self, source: str, query: str, k: int, exclude: Iterable[str] = ()) -> Optional[List[dict]]:
+        """Stored results answering the query, or None if none is similar enough (min_similarity) and a live search is needed."""
+
+        results = [result for similarity, result in self.search(source, query, k, exclude) if similarity >= self.min_similarity]
+        with self._lock:
+            if results:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return results or None
+
+    def stats(self) -> dict:
+        used = self.hits + self.misses
+        return {"docs": len(self._docs), "passages": int(np.count_nonzero(self._row_docs[:self._num_rows] >= 0)) if self._num_rows else 0, "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / used if used else 0.0}
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+
+def normalise_query(query: str) -> str:
+    """Normalise a search query so trivially different spellings share a cache entry."""
+
+    return " ".join(query.lower().split())
+
+
+def search_cache_key(source: str, query: str, max_results: int, doc_content_chars_max: int) -> str:
+    """Content-addressed key for a search request (source is "web" or "wiki")."""
+
+    payload = json.dumps([source, normalise_query(query), max_results, doc_content_chars_max])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SearchCache:
+    """Base class for search result caches. Values must be JSON-serialisable.
+
+    Subclasses implement _get/_set/_clear; hit/miss/eviction counters are kept here.
+    """
+
+    def __init__(self, ttl: Optional[float] = 24 * 60 * 60, max_entries: int = 10_000):
+        self.ttl = ttl # seconds until an entry expires (None = never)
+        self.max_entries = max_entries # size bound enforced with LRU eviction
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def _get(self, key: str):
+        raise NotImplementedError
+
+    def _set(self, key: str, value: Any):
+        raise NotImplementedError
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def get(self, key: str):
+        """Return the cached value or None, updating the hit/miss counters."""
+
+        with self._lock:
+            value = self._get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._set(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Any]):
+        """Return the cached value, or call fetch() and cache its result."""
+
+        value = self.get(key)
+        if value is None:
+            value = fetch()
+            self.set(key, value)
+        return value
+
+    async def aget_or_fetch(self, key: str, afetch: Callable[[], Awaitable[Any]]):
+        """Async variant of get_or_fetch."""
+
+        value = self.get(key)
+        if value is None:
+            value = await afetch()
+            self.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class InMemorySearchCache(SearchCache):
+    """Process-local LRU cache."""
+
+    def __init__(self, ttl: Optional[float] = 24 * 60 * 60, max_entries: int = 1_000):
+        super().__init__(ttl=ttl, max_entries=max_entries)
+        self._entries = OrderedDict() # key -> (created_at, value)
+
+    def _get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, value = entry
+        if self._expired(created_at):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set(self, key: str, value: Any):
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _clear(self):
+        self._entries.clear()
+
+
+class SQLiteSearchCache(SearchCache):
+    """On-disk cache shared across runs (and processes) through a SQLite file."""
+
+    def __init__(self, path: str = ".cache/search_cache.sqlite", ttl: Optional[float] = 7 * 24 * 60 * 60, max_entries: int = 100_000):
+        super().__init__(ttl=ttl, max_entries=max_entries)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS search_cache_accessed ON search_cache (accessed_at)")
+        self._conn.commit()
+
+    def _get(self, key: str):
+        row = self._conn.execute("SELECT value, created_at FROM search_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if self._expired(created_at):
+            self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+            self._conn.commit()
+            return None
+        self._conn.execute("UPDATE search_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+        return json.loads(value)
+
+    def _set(self, key: str, value: Any):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO search_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now, now),
+        )
+        # Evict the least recently used entries above the size bound
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()
+        if count > self.max_entries:
+            excess = count - self.max_entries
+            self._conn.execute(
+                "DELETE FROM search_cache WHERE key IN (SELECT key FROM search_cache ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            self.evictions += excess
+        self._conn.commit()
+
+    def _clear(self):
+        self._conn.execute("DELETE FROM search_cache")
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,46 @@
+from typing import List
+
+from src.utils.plan_assembly import canonical_url
+
+
+# Documents whose full content stays in the state (two cycles of web + Wikipedia results)
+MAX_FULL_DOCS = 8
+# Documents tracked at all; older ones are only kept as compact metadata (source, title, cycle)
+MAX_TRACKED_DOCS = 64
+
+DOC_SEPARATOR = "\n\n-----\n\n"
+
+
+def source_doc(source: str, title: str, content: str, cycle: int) -> dict:
+    """A search document as stored in the consultation state (content is the formatted <Document> block)."""
+
+    return {"source": source, "title": title, "content": content, "cycle": cycle}
+
+
+def merge_source_docs(existing: List[dict], new: List[dict]) -> List[dict]:
+    """Reducer for source_docs: a bounded store of search documents, deduplicated by canonical source URL.
+
+    A document found again replaces its earlier copy and moves to the end. Only the most recent
+    MAX_FULL_DOCS keep their content; older ones are compacted to metadata and the oldest dropped
+    beyond MAX_TRACKED_DOCS, so the checkpointed state no longer grows with the number of cycles.
+    """
+
+    docs = {canonical_url(doc["source"]): doc for doc in existing or []}
+    for doc in new or []:
+        key = canonical_url(doc["source"])
+        docs.pop(key, None)
+        docs[key] = doc
+
+    merged = list(docs.values())[-MAX_TRACKED_DOCS:]
+    compact_until = len(merged) - MAX_FULL_DOCS
+
+    return [
+        {key: value for key, value in doc.items() if key != "content"} if index < compact_until else doc
+        for index, doc in enumerate(merged)
+    ]
+
+
+def cycle_documents(docs: List[dict], cycle: int) -> List[str]:
+    """Contents of the documents retrieved during a given consultation cycle."""
+
+    return [doc["content"] for doc in docs if doc["cycle"] == cycle and doc.get("content")]
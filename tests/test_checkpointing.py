@@ -0,0 +1,63 @@
+from langgraph.checkpoint.base import empty_checkpoint
+
+from src.utils.checkpointing import SQLiteCheckpointer
+
+
+def put_step(checkpointer, config, checkpoint, values, step):
+    """Store a checkpoint updating the given channels, as LangGraph does after a step."""
+
+    checkpoint = {**checkpoint, "channel_values": {**checkpoint["channel_values"], **values}, "channel_versions": dict(checkpoint["channel_versions"])}
+    new_versions = {}
+    for channel in values:
+        new_versions[channel] = checkpointer.get_next_version(checkpoint["channel_versions"].get(channel))
+        checkpoint["channel_versions"][channel] = new_versions[channel]
+    checkpoint["id"] = f"{step:04}"
+    return checkpointer.put(config, checkpoint, {"step": step}, new_versions), checkpoint
+
+
+def test_put_get_list_round_trip():
+    checkpointer = SQLiteCheckpointer(":memory:", gc_every=0)
+    config = {"configurable": {"thread_id": "t", "checkpoint_ns": ""}}
+    checkpoint = empty_checkpoint()
+
+    config, checkpoint = put_step(checkpointer, config, checkpoint, {"problem": "stress", "branch:to:writer": None, "transcript": [{"text": "hi"}]}, 0)
+    config, checkpoint = put_step(checkpointer, config, checkpoint, {"transcript": [{"text": "hi"}, {"text": "hello"}]}, 1)
+    checkpointer.put_writes(config, [("transcript", [{"text": "pending"}])], task_id="task")
+
+    latest = checkpointer.get_tuple({"configurable": {"thread_id": "t", "checkpoint_ns": ""}})
+    assert latest.checkpoint["channel_values"] == {"problem": "stress", "branch:to:writer": None, "transcript": [{"text": "hi"}, {"text": "hello"}]}
+    assert latest.metadata["step"] == 1
+    assert latest.parent_config["configurable"]["checkpoint_id"] == "0000"
+    assert latest.pending_writes == [("task", "transcript", [{"text": "pending"}])]
+
+    history = list(checkpointer.list({"configurable": {"thread_id": "t"}}))
+    assert [item.checkpoint["id"] for item in history] == ["0001", "0000"]
+    assert history[1].checkpoint["channel_values"]["transcript"] == [{"text": "hi"}]
+
+
+def test_appended_lists_are_stored_as_deltas_and_rebased_on_gc():
+    checkpointer = SQLiteCheckpointer(":memory:", gc_every=0, max_checkpoints_per_thread=2)
+    config = {"configurable": {"thread_id": "t", "checkpoint_ns": ""}}
+    checkpoint = empty_checkpoint()
+
+    transcript = []
+    for step in range(5):
+        transcript = transcript + [{"speaker": "client", "text": f"turn {step}"}]
+        config, checkpoint = put_step(checkpointer, config, checkpoint, {"transcript": transcript}, step)
+
+    # Only the first blob holds the whole list, the others the appended turn
+    bases = checkpointer._conn.execute("SELECT base FROM blobs ORDER BY version").fetchall()
+    assert [base is None for (base,) in bases] == [True, False, False, False, False]
+
+    checkpointer.gc()
+
+    assert checkpointer.stats()["checkpoints"] == 2
+    assert checkpointer.stats()["blobs"] == 2
+    history = list(checkpointer.list({"configurable": {"thread_id": "t"}}))
+    assert [len(item.checkpoint["channel_values"]["transcript"]) for item in history] == [5, 4]
+
+    # Later deltas extend the rebased blobs
+    transcript = transcript + [{"speaker": "practitioner", "text": "turn 5"}]
+    put_step(checkpointer, config, checkpoint, {"transcript": transcript}, 5)
+    latest = checkpointer.get_tuple({"configurable": {"thread_id": "t", "checkpoint_ns": ""}})
+    assert latest.checkpoint["channel_values"]["transcript"] == transcript
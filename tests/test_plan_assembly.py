@@ -0,0 +1,34 @@
+from src.utils.plan_assembly import merge_sources, missing_sources, parse_section
+
+
+def test_merge_sources_renumbers_citations_plan_wide():
+    parts = [
+        parse_section("## Sleep\n\nKeep a regular schedule [1].\n\n### Sources\n[1] https://example.org/sleep\n"),
+        parse_section("## Stress\n\nTake short breaks [1] and walk [2].\n\n### Sources\n[1] https://www.example.org/sleep/\n[2] https://example.org/walk\n"),
+    ]
+
+    bodies, sources = merge_sources(parts)
+
+    assert sources == ["https://example.org/sleep", "https://example.org/walk"]
+    assert bodies == ["Keep a regular schedule [1].", "Take short breaks [1] and walk [2]."]
+    assert missing_sources(parts) == []
+
+
+def test_bold_sources_header_is_parsed():
+    part = parse_section("## Sleep\n\nKeep a regular schedule [1].\n\n**Sources**\n[1] https://example.org/sleep\n")
+
+    assert part["sources"] == [[1, "https://example.org/sleep"]]
+    assert part["body"] == "Keep a regular schedule [1]."
+
+
+def test_section_without_sources_list_keeps_its_citations():
+    parts = [
+        parse_section("## Sleep\n\nKeep a regular schedule [1].\n\n### Sources\n[1] https://example.org/sleep\n"),
+        parse_section("## Stress\n\nTake short breaks [2].\n\nReferences follow below."),
+    ]
+
+    bodies, sources = merge_sources(parts)
+
+    assert missing_sources(parts) == ["Stress"]
+    assert bodies[1] == "Take short breaks [2].\n\nReferences follow below."
+    assert sources == ["https://example.org/sleep"]